@@ -7,4 +7,7 @@ from src import startgame
 MAP_HEIGHT = 512
 MAP_WIDTH = 1024
 
-startgame.set_up(MAP_WIDTH, MAP_HEIGHT)
+#Big caves can be made by several processes (see mapgen.generateStriped). On platforms where the
+#processes start by importing this file, the game must not be started again in each of them
+if __name__ == '__main__':
+    startgame.set_up(MAP_WIDTH, MAP_HEIGHT)
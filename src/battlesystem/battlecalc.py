@@ -4,6 +4,11 @@
     between monsters and player
 """
 
+from src.telemetry import events
+from src.gameobjects_and_movement.GameObject import PIXELS
+
+RANGED_DAMAGE_DIVISOR = 2 #ranged attacks and spells do half the damage of a melee attack
+
 def playerAttack(monsters, player, direction):
     """The player attacks a monster. Calculate damage done to the monster
        @param monsters: the list of monsters
@@ -14,13 +19,13 @@ def playerAttack(monsters, player, direction):
     """
 
     if direction == 'D':
-        attackPosition = (player.getXposition(), player.getYposition() + 16)
+        attackPosition = (player.getXposition(), player.getYposition() + PIXELS)
     elif direction == 'U':
-        attackPosition = (player.getXposition(), player.getYposition() - 16)
+        attackPosition = (player.getXposition(), player.getYposition() - PIXELS)
     elif direction == 'L':
-        attackPosition = (player.getXposition() - 16, player.getYposition())
+        attackPosition = (player.getXposition() - PIXELS, player.getYposition())
     elif direction == 'R':
-        attackPosition = (player.getXposition() + 16, player.getYposition())
+        attackPosition = (player.getXposition() + PIXELS, player.getYposition())
 
     for m in monsters:
         if m.getPosition() == attackPosition:
@@ -29,20 +34,48 @@ def playerAttack(monsters, player, direction):
     #Nothing to attack
     return (False, 0)
 
-def calculateOutcome(monster, player, monsters):
+def playerRangedAttack(monsters, player, lineOfSight, attackRange):
+    """The player shoots at the closest monster it can see
+       @param monsters: the monsters that can be hit, like the ones near the player
+       @param player: the player object
+       @param lineOfSight: the line of sight for the cave
+       @param attackRange: max range in tiles
+       @return: the same as playerAttack
+    """
+
+    target = None
+    targetDistance = None
+
+    for m in monsters:
+        distance = abs(m.getXposition() - player.getXposition()) + abs(m.getYposition() - player.getYposition())
+        if (target is None or distance < targetDistance) and lineOfSight.objectCanSee(player, m, attackRange):
+            target = m
+            targetDistance = distance
+
+    #Nothing to shoot at
+    if target is None:
+        return (False, 0)
+
+    return calculateOutcome(target, player, monsters, RANGED_DAMAGE_DIVISOR)
+
+def calculateOutcome(monster, player, monsters, divisor=1):
     """Calculate the outcome when a player attacks a monster
        @param monster: the monster getting attacked
        @param player: the player
        @param monsters: the list of monsters
+       @param divisor: the damage is divided by this, used for ranged attacks
        @return: a tuple with two values, the first value is a boolean which is true/false depending
                 on the monsters state after the attack (alive/dead). The second value is the damage done
        """
 
     #The damage done is the difference between the players attack power and the monsters armor
-    damageDone = player.getAttackPower() - monster.getArmor()
+    damageDone = (player.getAttackPower() - monster.getArmor()) / divisor
     monster.decreaseHP(damageDone)
+    events.emit(events.DAMAGE_DEALT, damage=damageDone, monsterHP=monster.getHP(), position=monster.getPosition())
+
     if monster.getHP() <= 0:
         monsters.remove(monster)
+        events.emit(events.KILL, position=monster.getPosition())
         return (True, damageDone) #monster died
     else:
         return (False, damageDone) #monster still lives
@@ -56,10 +89,12 @@ def calculateOutcome2(player, monster):
 
     return monster.getAttackPower() - player.getArmor()
 
-def monsterAttack(monsters, player):
+def monsterAttack(monsters, player, lineOfSight=None):
     """The monsters attack the player
        @param monsters: the list of monster objects
        @param player: the player object
+       @param lineOfSight: the line of sight for the cave. If it is given, spellcasters that can see
+                           the player cast a spell at it
        @return: a tuple with two values, the first value is a boolean which is true/false depending
                 on the player state after the attack (alive/dead). The second value is the damage done
        """
@@ -72,13 +107,30 @@ def monsterAttack(monsters, player):
         monsterPos = m.getPosition()
 
         if playerIsAdjacent(m, player):
-            damageDone += calculateOutcome2(player, m)
+            damage = calculateOutcome2(player, m)
+            damageDone += damage
+            events.emit(events.DAMAGE_TAKEN, damage=damage, position=monsterPos)
+
+        elif lineOfSight is not None and canCastAt(m, player, lineOfSight):
+            damage = calculateOutcome2(player, m) / RANGED_DAMAGE_DIVISOR
+            damageDone += damage
+            events.emit(events.DAMAGE_TAKEN, damage=damage, position=monsterPos, spell=True)
 
     #player loses HP
     player.decreaseHP(damageDone)
 
     return (player.getHP() <= 0, damageDone)
 
+def canCastAt(monster, player, lineOfSight):
+    """Check if a monster can cast a spell at the player
+       @param monster: the monster object
+       @param player: the player object
+       @param lineOfSight: the line of sight for the cave
+       @return: True if the monster is a spellcaster and the player is in range and can be seen
+    """
+
+    return monster.getSpellRange() > 0 and lineOfSight.objectCanSee(monster, player, monster.getSpellRange())
+
 def playerIsAdjacent(monster, player):
     """Check if the player is adjacent to a monster
        @param monster: the monster object
@@ -86,10 +138,10 @@ def playerIsAdjacent(monster, player):
        @return True if player is adjacent, false if not
     """
 
-    if (monster.getXposition() + 16, monster.getYposition()) == player.getPosition() or \
-                (monster.getXposition() - 16, monster.getYposition()) == player.getPosition() or \
-                (monster.getXposition(), monster.getYposition() + 16) == player.getPosition() or \
-                (monster.getXposition(), monster.getYposition() - 16) == player.getPosition():
+    if (monster.getXposition() + PIXELS, monster.getYposition()) == player.getPosition() or \
+                (monster.getXposition() - PIXELS, monster.getYposition()) == player.getPosition() or \
+                (monster.getXposition(), monster.getYposition() + PIXELS) == player.getPosition() or \
+                (monster.getXposition(), monster.getYposition() - PIXELS) == player.getPosition():
         return True
     else:
          return False
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+    Line of sight for ranged attacks and spells. A target can be seen if no wall is on the
+    Bresenham line between it and the one looking. The tiles on the line only depend on the
+    distance between the two tiles, so the lines are made once for each range and stored as
+    tables of offsets. Results are cached for each pair of tiles. Digging only turns walls into
+    ground, so a dig can make hidden tiles visible but never the other way around: only the
+    cached hidden results are thrown away when the cave changes.
+"""
+
+from src.gameobjects_and_movement.GameObject import PIXELS
+
+#Ray tables for each range, see rayTable
+rayTables = {}
+
+MAX_CACHE_SIZE = 100000 #the caches are emptied when they get bigger than this
+
+def bresenham(dx, dy):
+    """Find the tiles on the line from (0, 0) to (dx, dy)
+       @param dx: x distance in tiles
+       @param dy: y distance in tiles
+       @return: tuple of (x, y) offsets, without the first and last tile
+    """
+
+    line = []
+    stepX = 1 if dx > 0 else -1
+    stepY = 1 if dy > 0 else -1
+    dx, dy = abs(dx), abs(dy)
+    x = y = 0
+    error = dx - dy
+
+    while (x * stepX, y * stepY) != (dx, dy):
+        double = 2 * error
+        if double > -dy:
+            error -= dy
+            x += stepX
+        if double < dx:
+            error += dx
+            y += stepY
+        line.append((x, y))
+
+    return tuple(line[:-1])
+
+def rayTable(radius):
+    """Get the lines to all tiles within a range. The table is made the first time a range is used
+       @param radius: the range in tiles
+       @return: dict with (dx, dy) as key and the offsets of the tiles between as value
+    """
+
+    table = rayTables.get(radius)
+
+    if table is None:
+        table = {}
+        for dy in range(-radius, radius + 1):
+            for dx in range(-radius, radius + 1):
+                if dx * dx + dy * dy <= radius * radius:
+                    table[(dx, dy)] = bresenham(dx, dy)
+        rayTables[radius] = table
+
+    return table
+
+class LineOfSight:
+    """Checks if one tile can be seen from another"""
+
+    def __init__(self, cave):
+        """Constructor
+           @param cave: the map
+        """
+        self.rebuild(cave)
+
+    def rebuild(self, cave):
+        """Start over with a new cave. Called when a new level is made
+           @param cave: the map
+        """
+        self.width = len(cave[0])
+        self.height = len(cave)
+
+        #Tile (x, y) has index y * width + x, like in the distance maps
+        self.passable = bytearray(1 if tile.isPassable() else 0 for row in cave for tile in row)
+        self.rays = {}      #range -> dict of (dx, dy) -> tuple of flat offsets, for this map width
+        self.visible = {}   #(origin, target) -> True, for pairs that can see each other
+        self.hidden = {}    #(origin, target) -> True, for pairs with a wall between
+
+    def caveChanged(self, tile):
+        """Must be called when a wall has been dug down
+           @param tile: the tile that changed
+        """
+        index = (tile.getYposition() / PIXELS) * self.width + tile.getXposition() / PIXELS
+        self.passable[index] = 1 if tile.isPassable() else 0
+        self.hidden = {}
+
+    def flatRays(self, radius):
+        """Get the ray table for a range, with the offsets turned into tile indexes for this map
+           @param radius: the range in tiles
+           @return: dict of (dx, dy) -> tuple of index offsets
+        """
+
+        rays = self.rays.get(radius)
+
+        if rays is None:
+            rays = dict((key, tuple(y * self.width + x for x, y in line)) for key, line in rayTable(radius).iteritems())
+            self.rays[radius] = rays
+
+        return rays
+
+    def canSee(self, x1, y1, x2, y2, radius):
+        """Check if a tile can be seen from another tile
+           @param x1: x index of the tile looking
+           @param y1: y index of the tile looking
+           @param x2: x index of the target tile
+           @param y2: y index of the target tile
+           @param radius: max range in tiles
+           @return: True if the target is in range and no wall is in the way, False if not
+        """
+
+        dx, dy = x2 - x1, y2 - y1
+        if dx * dx + dy * dy > radius * radius:
+            return False
+
+        origin = y1 * self.width + x1
+        key = (origin, y2 * self.width + x2)
+        if key in self.visible:
+            return True
+        if key in self.hidden:
+            return False
+
+        passable = self.passable
+        for offset in self.flatRays(radius)[(dx, dy)]:
+            if not passable[origin + offset]:
+                if len(self.hidden) > MAX_CACHE_SIZE:
+                    self.hidden = {}
+                self.hidden[key] = True
+                return False
+
+        if len(self.visible) > MAX_CACHE_SIZE:
+            self.visible = {}
+        self.visible[key] = True
+        return True
+
+    def objectCanSee(self, viewer, target, radius):
+        """Check if a game object can see another one
+           @param viewer: the player or a monster
+           @param target: the player or a monster
+           @param radius: max range in tiles
+           @return: True if the target can be seen
+        """
+        return self.canSee(viewer.getXposition() / PIXELS, viewer.getYposition() / PIXELS,
+                           target.getXposition() / PIXELS, target.getYposition() / PIXELS, radius)
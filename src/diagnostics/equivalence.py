@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+    Differential equivalence harness. Plays many short games without a screen, once with the
+    reference copies of the original code (see reference.py) and once with the current code,
+    from the same seed and the same input script, and reports the first turn where the two games
+    are not in the same state. The games are spread over several processes.
+
+    The harness compares the cave generator, checkValidMove, findPlayer and battlecalc. All
+    monsters act every turn, like in the original game, so the turn scheduler and the sleeping
+    monsters are not part of the comparison. Two engines are compared with the reference:
+    "current" gives every monster the whole monster list to bump into, and "activity" only gives
+    it the monsters in the activity index regions around it. The game gives the awake monsters
+    the monsters in the regions around all of them, so if the activity engine plays the same
+    game, so do the lists in the game.
+
+    The striped cave generator starts its own processes, so it is compared with the original
+    generator in the main process before the games are played.
+
+    Run it from the top folder of the game:
+        python -m src.diagnostics.equivalence --games 1000 --turns 300
+"""
+
+import pygame, argparse, multiprocessing, random, time
+from collections import namedtuple
+
+from src.mapgenerator import mapgen
+from src.gameobjects_and_movement import GameObject, activity as monsteractivity, scheduler as turnscheduler
+from src.gameobjects_and_movement.GameObject import PIXELS
+from src.battlesystem import battlecalc
+from src.diagnostics import reference
+
+#Size of the cave in tiles. The same as the cave in rungame.py
+CAVE_WIDTH = 64
+CAVE_HEIGHT = 32
+
+MONSTER_COUNT = 15
+DUNGEON_LEVEL = 1
+
+#How often each action is picked for a random input script
+ACTION_WEIGHTS = [('move', 6), ('attack', 2), ('dig', 1), ('wait', 1)]
+DIRECTIONS = ['L', 'R', 'U', 'D']
+DIRECTION_KEYS = {'L': pygame.K_LEFT, 'R': pygame.K_RIGHT, 'U': pygame.K_UP, 'D': pygame.K_DOWN}
+
+#The player only looks at the key of an event
+KeyEvent = namedtuple('KeyEvent', 'key')
+
+class Engine:
+    """The functions one side of the comparison plays with"""
+
+    def __init__(self, name, makeCave, playerClass, monsterClass, playerAttack, monsterAttack, useActivity=False):
+        """Constructor
+           @param name: name used in the report
+           @param makeCave: function that takes the width and height in pixels and returns a cave
+           @param playerClass: class of the player
+           @param monsterClass: class of the monsters
+           @param playerAttack: same as battlecalc.playerAttack
+           @param monsterAttack: same as battlecalc.monsterAttack
+           @param useActivity: True to only give the player and monsters the monsters near them from an
+                               activity index, False to give them the whole monster list
+        """
+        self.name = name
+        self.makeCave = makeCave
+        self.playerClass = playerClass
+        self.monsterClass = monsterClass
+        self.playerAttack = playerAttack
+        self.monsterAttack = monsterAttack
+        self.useActivity = useActivity
+
+def currentCave(width, height):
+    """Make a cave with the current generator, the cellular automata on a grid"""
+    return mapgen.buildCave(mapgen.cellularGrid(width / PIXELS, height / PIXELS), width, height, None, None, None)
+
+def referenceCave(width, height):
+    """Make a cave with the original generator"""
+    return reference.generate(width, height, None, None, None)
+
+ENGINES = {
+    'reference': Engine('reference', referenceCave, reference.ReferencePlayer, reference.ReferenceMonster,
+                        reference.playerAttack, reference.monsterAttack),
+    'current': Engine('current', currentCave, GameObject.Player, GameObject.Monster,
+                      battlecalc.playerAttack, battlecalc.monsterAttack),
+    'activity': Engine('activity', currentCave, GameObject.Player, GameObject.Monster,
+                       battlecalc.playerAttack, battlecalc.monsterAttack, useActivity=True),
+}
+
+#The engines compared with the reference, in this order
+COMPARED_ENGINES = ['current', 'activity']
+
+def makeScript(seed, turns):
+    """Make a random input script
+       @param seed: the seed for the script, not the same random numbers as the game
+       @param turns: number of actions
+       @return: list of actions, each a tuple with the action name and a direction (None for wait)
+    """
+
+    scriptRandom = random.Random(seed)
+    actions = [name for name, weight in ACTION_WEIGHTS for i in range(weight)]
+    script = []
+
+    for turn in range(turns):
+        action = scriptRandom.choice(actions)
+        script.append((action, None if action == 'wait' else scriptRandom.choice(DIRECTIONS)))
+
+    return script
+
+def readScript(filename):
+    """Read an input script from a file, with one action per line like "move L" or "wait"
+       @param filename: the file to read
+       @return: list of actions, like makeScript
+    """
+
+    script = []
+    with open(filename) as scriptFile:
+        for line in scriptFile:
+            words = line.split()
+            if words:
+                script.append((words[0], words[1] if len(words) > 1 else None))
+
+    return script
+
+def caveState(cave):
+    """Get the state of a cave
+       @return: string with one character per tile, # for wall and . for ground
+    """
+    return '\n'.join(''.join('.' if tile.isPassable() else '#' for tile in row) for row in cave)
+
+def gameState(player, monsters, result):
+    """Get the state of a game after a turn
+       @param player: the player
+       @param monsters: list of monsters
+       @param result: the outcome of the turn
+       @return: tuple that is equal for two games in the same state
+    """
+    return (('player', player.getPosition(), player.getHP(), player.getArmor(), player.getAttackPower()),
+            ('monsters', tuple((m.getPosition(), m.getHP(), m.direction) for m in monsters)),
+            ('result', result))
+
+def playGame(engine, seed, script):
+    """Play a game with an engine
+       @param engine: the engine to play with
+       @param seed: the seed for the game
+       @param script: the input script
+       @return: list of states, the first is the cave and the rest is the game state after each turn
+    """
+
+    #There is no screen to load the tile images for, so dug tiles get no image
+    mapgen.images.setdefault(mapgen.GROUND_TILE, None)
+
+    random.seed(seed)
+
+    cave = engine.makeCave(CAVE_WIDTH * PIXELS, CAVE_HEIGHT * PIXELS)
+    states = [caveState(cave)]
+
+    player = engine.playerClass(None, position=(random.randrange(0, CAVE_WIDTH * PIXELS, PIXELS),
+                                random.randrange(0, CAVE_HEIGHT * PIXELS, PIXELS)), object_image=None, object_cave=cave,
+                                dungeon_level=DUNGEON_LEVEL)
+
+    monsters = []
+    for i in range(MONSTER_COUNT):
+        monsters.append(engine.monsterClass(None, position=(random.randrange(0, CAVE_WIDTH * PIXELS, PIXELS),
+                        random.randrange(0, CAVE_HEIGHT * PIXELS, PIXELS)), object_image=None, object_cave=cave,
+                        dungeon_level=DUNGEON_LEVEL))
+
+    #The monsters are only looked up in the index, they are not scheduled
+    activity = None
+    if engine.useActivity:
+        activity = monsteractivity.ActivityIndex(monsters, turnscheduler.TurnScheduler())
+
+    for action, direction in script:
+
+        if action == 'move':
+            nearby = monsters if activity is None else activity.monstersNear(player.getPosition(), 1)
+            player.handleKey(KeyEvent(DIRECTION_KEYS[direction]), nearby)
+            result = None
+        elif action == 'attack':
+            result = engine.playerAttack(monsters, player, direction)
+        elif action == 'dig':
+            result = mapgen.updateCave(None, cave, direction, player.getXposition(), player.getYposition()) is not None
+        else:
+            result = None
+
+        #All monsters move and attack, like in the original game loop
+        for m in monsters:
+            nearby = monsters if activity is None else activity.monstersNear(m.getPosition(), 1)
+            oldPosition = m.getPosition()
+
+            if m.findPlayer(player, nearby) == -1:
+                m.walk(nearby, player)
+
+            if activity is not None:
+                activity.moved(m, oldPosition)
+
+        attackResult = engine.monsterAttack(monsters, player)
+        states.append(gameState(player, monsters, (result, attackResult)))
+
+        #remove dead monsters
+        for m in monsters:
+            if m.getHP() <= 0:
+                monsters.remove(m)
+
+        if attackResult[0]:
+            break
+
+    return states
+
+def compareGame(job):
+    """Play one game with the reference and each compared engine. Runs in a worker process
+       @param job: tuple with the seed, and the script or the number of turns for a random script
+       @return: None if the games are the same, otherwise a dict describing the first difference
+    """
+
+    seed, script = job
+    if isinstance(script, int):
+        script = makeScript(seed, script)
+
+    referenceStates = playGame(ENGINES['reference'], seed, script)
+
+    for name in COMPARED_ENGINES:
+        states = playGame(ENGINES[name], seed, script)
+
+        for turn in range(max(len(referenceStates), len(states))):
+            referenceState = referenceStates[turn] if turn < len(referenceStates) else "game over"
+            state = states[turn] if turn < len(states) else "game over"
+
+            if referenceState != state:
+                return {'seed': seed, 'engine': name, 'turn': turn, 'action': script[turn - 1] if turn > 0 else None,
+                        'before': referenceStates[turn - 1] if turn > 0 else None,
+                        'reference': referenceState, 'compared': state}
+
+    return None
+
+def compareStriped(seeds, processes):
+    """Compare the caves made by mapgen.generateStriped with the original generator. Runs in the main
+       process, since generateStriped starts a pool of processes of its own. The pool is stopped
+       afterwards, so it is not copied into the processes that play the games
+       @param seeds: list of seeds, one cave is made for each
+       @param processes: number of processes generateStriped splits the cave between
+       @return: list of differences, like compareGame
+    """
+
+    differences = []
+
+    for seed in seeds:
+        random.seed(seed)
+        referenceState = caveState(referenceCave(CAVE_WIDTH * PIXELS, CAVE_HEIGHT * PIXELS))
+        random.seed(seed)
+        stripedState = caveState(mapgen.generateStriped(CAVE_WIDTH * PIXELS, CAVE_HEIGHT * PIXELS, None, None, None,
+                                                        processes=processes))
+
+        if referenceState != stripedState:
+            differences.append({'seed': seed, 'engine': 'striped', 'turn': 0, 'action': None, 'before': None,
+                                'reference': referenceState, 'compared': stripedState})
+
+    mapgen.closeStripePool()
+    return differences
+
+def formatState(state):
+    """Make a readable dump of a game state
+       @param state: a state from playGame
+       @return: list of lines
+    """
+
+    #The first state is the cave
+    if not isinstance(state, tuple):
+        return state.split('\n')
+
+    player, monsters, result = state
+    lines = ["    player: position %s, HP %d, armor %d, attack power %d" % player[1:]]
+    for position, hitPoints, direction in monsters[1]:
+        lines.append("    monster: position %s, HP %d, direction %s" % (position, hitPoints, direction))
+    lines.append("    action result: %s, monster attack: %s" % result[1])
+
+    return lines
+
+def formatDifference(difference):
+    """Make a state dump of a difference
+       @param difference: a dict returned by compareGame
+       @return: the text
+    """
+
+    if difference['turn'] == 0:
+        lines = ["Seed %d, %s engine: the caves are not the same" % (difference['seed'], difference['engine'])]
+    else:
+        action, direction = difference['action']
+        lines = ["Seed %d, %s engine: first difference in turn %d, action %s" % (difference['seed'], difference['engine'],
+                 difference['turn'], action if direction is None else action + " " + direction)]
+        lines.append("before the turn:")
+        lines.extend(formatState(difference['before']))
+
+    lines.append("reference:")
+    lines.extend(formatState(difference['reference']))
+    lines.append(difference['engine'] + ":")
+    lines.extend(formatState(difference['compared']))
+
+    return '\n'.join(lines)
+
+def run(seeds, script, processes=None, stripedProcesses=2):
+    """Compare the engines for many games
+       @param seeds: list of seeds, one game is played for each
+       @param script: the input script used by all games, or the number of turns for a random script per seed
+       @param processes: number of worker processes, default is one per core
+       @param stripedProcesses: number of processes for the striped cave generator, 0 to not compare it
+       @return: list of differences, sorted by seed
+    """
+
+    differences = compareStriped(seeds, stripedProcesses) if stripedProcesses > 0 else []
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.imap_unordered(compareGame, [(seed, script) for seed in seeds], chunksize=8)
+        differences.extend(result for result in results if result is not None)
+    finally:
+        pool.close()
+        pool.join()
+
+    return sorted(differences, key=lambda difference: difference['seed'])
+
+def main():
+    """Run the harness from the command line"""
+
+    parser = argparse.ArgumentParser(description="Compare the original and the current game code")
+    parser.add_argument('--games', type=int, default=1000, help="number of games to play")
+    parser.add_argument('--first-seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--turns', type=int, default=300, help="turns per game, for random input scripts")
+    parser.add_argument('--script', help="file with an input script to use for all games")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes, default is one per core")
+    parser.add_argument('--striped-processes', type=int, default=2,
+                        help="processes for the striped cave generator, 0 to not compare it")
+    args = parser.parse_args()
+
+    script = readScript(args.script) if args.script else args.turns
+    seeds = range(args.first_seed, args.first_seed + args.games)
+
+    start = time.time()
+    differences = run(seeds, script, args.processes, args.striped_processes)
+
+    print "Played %d games in %.1f s" % (len(seeds), time.time() - start)
+    if differences:
+        print "%d games were not the same. The first one:" % len(differences)
+        print formatDifference(differences[0])
+    else:
+        print "All games were the same"
+
+    return 1 if differences else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
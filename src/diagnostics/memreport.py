@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    Memory accounting for the game. The live objects of each subsystem (cave grid, tile images,
+    monsters and items, text surfaces and so on) are registered with a MemoryReport, which can
+    measure how many bytes each subsystem uses. A report can be shown on demand with the debug key,
+    and snapshots can be written to a file at a regular interval and at every new dungeon level.
+    Objects kept alive outside the registered subsystems are found by counting all objects
+    tracked by the garbage collector. If tracemalloc is available (Python 3.4 or newer) it is
+    used to report the total memory allocated by Python as well.
+"""
+
+import sys, time, gc
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+#Set SNAPSHOT_FILE to a file name to turn on snapshots and growth checks between levels
+SNAPSHOT_FILE = None
+SNAPSHOT_INTERVAL = 60          #seconds between each periodic snapshot
+GROWTH_WARNING = 512 * 1024     #warn if memory grows more than this many bytes between two levels
+OBJECT_GROWTH_WARNING = 5000    #warn if this many more objects are alive than on the last level
+
+def sizeOf(obj, seen):
+    """Find the size of an object and everything it contains, objects in seen are not counted again
+       @param obj: the object to measure
+       @param seen: set of ids of objects that are already counted
+       @return: size in bytes
+    """
+
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    #pygame surfaces keep their pixels outside of the python object
+    if hasattr(obj, 'get_bytesize') and hasattr(obj, 'get_size'):
+        width, height = obj.get_size()
+        return size + width * height * obj.get_bytesize()
+
+    if isinstance(obj, dict):
+        for key in obj:
+            size += sizeOf(key, seen) + sizeOf(obj[key], seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += sizeOf(item, seen)
+    else:
+        if hasattr(obj, '__dict__'):
+            size += sizeOf(obj.__dict__, seen)
+        for slot in getattr(type(obj), '__slots__', ()):
+            if hasattr(obj, slot):
+                size += sizeOf(getattr(obj, slot), seen)
+
+    return size
+
+class MemoryReport:
+    """Keeps track of the subsystems and measures their memory use"""
+
+    def __init__(self, ignore=()):
+        """Constructor
+           @param ignore: objects that should never be counted, like the screen surface
+        """
+        self.subsystems = OrderedDict()  #subsystem name -> function returning its live objects
+        self.ignore = list(ignore)
+        self.lastSnapshot = time.time()
+        self.levelTotal = None
+        self.levelObjects = None
+
+        if SNAPSHOT_FILE is not None and tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def register(self, name, getObjects):
+        """Register a subsystem. Objects shared between subsystems are counted in the first one registered
+           @param name: the subsystem name
+           @param getObjects: function returning a list of the live objects of the subsystem
+        """
+        self.subsystems[name] = getObjects
+
+    def measure(self):
+        """Measure the memory use of all subsystems
+           @return: list of tuples with the subsystem name and its size in bytes
+        """
+        seen = set(id(obj) for obj in self.ignore)
+
+        #The lists made by the subsystems must be kept alive until the end, or their ids could be reused
+        measured = []
+        sizes = []
+        for name, getObjects in self.subsystems.items():
+            measured.append(getObjects())
+            sizes.append((name, sizeOf(measured[-1], seen)))
+
+        return sizes
+
+    def format(self, sizes=None):
+        """Make a one-line report of the memory use
+           @param sizes: result of measure, measure again if not given
+           @return: the report as a string
+        """
+        if sizes is None:
+            sizes = self.measure()
+
+        report = ", ".join(name + ": " + str(size / 1024) + " KB" for name, size in sizes)
+        report = "Memory - " + report + ". Total: " + str(sum(size for name, size in sizes) / 1024) + " KB" + \
+                 ", objects: " + str(len(gc.get_objects()))
+
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report += " (traced " + str(current / 1024) + " KB, peak " + str(peak / 1024) + " KB)"
+
+        return report
+
+    def write(self, line):
+        """Append a line to the snapshot file
+           @param line: the line to write
+        """
+        with open(SNAPSHOT_FILE, 'a') as snapshotFile:
+            snapshotFile.write(time.strftime('%H:%M:%S') + " " + line + "\n")
+
+    def update(self):
+        """Write a snapshot if snapshots are turned on and it is time for a new one.
+           Should be called once every frame
+        """
+        if SNAPSHOT_FILE is not None and time.time() - self.lastSnapshot >= SNAPSHOT_INTERVAL:
+            self.lastSnapshot = time.time()
+            self.write(self.format())
+
+    def levelChanged(self, dungeonLevel):
+        """Check if the memory use has grown since the last level. Should be called when a new
+           level is made, after the old one is thrown away
+           @param dungeonLevel: the new dungeon level
+           @return: a warning message if the memory grew too much, else None
+        """
+        if SNAPSHOT_FILE is None:
+            return None
+
+        #Old levels can be kept alive by reference cycles, so collect them before measuring
+        gc.collect()
+
+        sizes = self.measure()
+        total = sum(size for name, size in sizes)
+        objects = len(gc.get_objects())
+        self.write("Level " + str(dungeonLevel) + ": " + self.format(sizes))
+
+        warning = None
+        if self.levelTotal is not None and total - self.levelTotal > GROWTH_WARNING:
+            warning = "Memory grew by " + str((total - self.levelTotal) / 1024) + " KB since the last level!"
+        elif self.levelObjects is not None and objects - self.levelObjects > OBJECT_GROWTH_WARNING:
+            warning = str(objects - self.levelObjects) + " more objects alive than on the last level!"
+
+        if warning is not None:
+            self.write(warning)
+
+        self.levelTotal = total
+        self.levelObjects = objects
+        return warning
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+    Reference copies of the original cave generator, movement and battle code, as they were
+    before any of them were optimized. The equivalence harness runs games with these and with
+    the current code and checks that they behave the same. Don't change or optimize this file,
+    it is what the current code is compared against.
+"""
+
+import random
+from src.mapgenerator.mapgen import Tile, ITERATIONS, WALLFACTOR, WALLFACTOR2, FILLFACTOR
+from src.gameobjects_and_movement.GameObject import Player, Monster, PIXELS
+
+def calculateNearbyWalls(tile, cave):
+    """Calculate number of adjacent walls
+       @param cave: the map
+       @return: number of adjacent walls
+    """
+
+    numwalls = 0
+
+    """Loop through the 8 adjacent tiles surrounding"""
+    for y in range(-1, 2*1):
+        for x in range(-1, 2*1):
+
+            #skip self
+            if y == 0 and y == x:
+                continue
+            if not cave[(tile.getYposition() / 16) + y][(tile.getXposition() / 16) + x].isPassable():
+                numwalls += 1
+
+    return numwalls
+
+
+def generate(xCord, yCord, wall_image, ground_image, screen):
+    """Generate the cave using cellular automata. The rules are as follows:
+       If a tile has at least WALLFACTOR adjacent walls, make it a wall.
+       If a tile has WALLFACTOR2 adjacent wall tiles, make it a wall
+       All other tiles are ground tiles
+       The cave generator can take a few seconds to complete, depending on map size.
+       A problem with this generator is that the cave can be disconnected.
+       With the current settings, most the caves generated seems ok
+       @param xCord: map width
+       @param yCord: map height
+       @param wall_image: image for wall tiles
+       @param ground_image: image for ground tiles
+       @param screen: the game screen to draw on
+       @return: the generated cave
+       """
+
+    #The cavemap is a 2D list of tile objects
+    cave = [[ None for x in range(0, xCord, 16)] for y in range(0, yCord, 16)]
+
+    #Init cave. The cave edges are wall tiles, the rest are random
+    for y in range(0, int(yCord / 16)):
+        for x in range(0, int(xCord / 16)):
+            #Make walls around border
+            if x == 0 or y == 0 or y == (yCord / 16) - 1 or x == (xCord / 16) - 1:
+                cave[y][x] = Tile(passable=False, digable=False, position=(x*16, y*16), screen=screen, tile_image=wall_image)
+            #Make ground tile
+            elif random.randint(0, 100) > FILLFACTOR:
+                cave[y][x] = Tile(passable=True, digable=True, position=(x*16, y*16), screen=screen, tile_image=ground_image)
+            #Make wall tile
+            else:
+                cave[y][x] = Tile(passable=False, digable=True, position=(x*16, y*16), screen=screen, tile_image=wall_image)
+
+    #Iteratively build the cave
+    for iteration in range(ITERATIONS):
+
+        #lists of tiles to be updated
+        tilesToWall = []
+        tilesToGround = []
+
+        for y in range(0, int(yCord / 16)):
+            for x in range(0, int(xCord / 16)):
+
+                #Dont do anything to border walls
+                if x == 0 or y == 0 or y == (yCord / 16) - 1 or x == (xCord / 16) - 1:
+                    continue
+
+                #Calculate number of adjacent wall tiles
+                adjacentWalls = calculateNearbyWalls(cave[y][x], cave)
+                if adjacentWalls >= WALLFACTOR or adjacentWalls == WALLFACTOR2:
+                    tilesToWall.append(cave[y][x])
+                else:
+                    tilesToGround.append(cave[y][x])
+
+        #Update tiles
+        for tile in tilesToWall:
+            tile.updateTile(False, wall_image)
+        for tile in tilesToGround:
+            tile.updateTile(True, ground_image)
+
+    return cave
+
+def checkValidMove(self, y, x, monsterList, player):
+    """Check if a move is legal
+       @return: False, if it is a monster, player or a wall in postion x and y
+       @return: True, if it is a legal move
+    """
+
+    for m in monsterList:
+        if (m.getXposition() == x) and (m.getYposition() == y):
+            return False
+
+    if player is not None and ((player.getXposition() == x) and player.getYposition() == y):
+        return False
+
+    return self.cave[y/PIXELS][x/PIXELS].isPassable()
+
+def findPlayer(self, player, monsterList):
+    """Find out if a player is in range for a monster, if a player is in range of max 5 tiles. The monster move towards the player to attack it
+       @return: 1 if the player is in range
+       @return: -1 if the player is not in range
+    """
+
+    #Find out how far the player is
+    costFromMonsterToPlayer = (abs((self.getXposition()/PIXELS) - (player.getXposition()/PIXELS)) + abs((self.getYposition()/PIXELS) - (player.getYposition()/PIXELS)))
+
+    #Move towards the player if the player is in rage
+    if costFromMonsterToPlayer <= 5:
+
+        #Are the player to the left or to the rigt of the monster
+        if self.getXposition() > player.getXposition():
+            dirX = -PIXELS
+        elif self.getXposition() < player.getXposition():
+            dirX = PIXELS
+        else:
+            dirX = 0
+
+        #Are the player to the left  or to the rigt of the monster
+        if self.getYposition() > player.getYposition():
+            dirY = -PIXELS
+        elif self.getYposition() < player.getYposition():
+            dirY = PIXELS
+        else:
+            dirY = 0
+
+        #Can we move to the new position?
+        if self.checkValidMove(self.getYposition(), self.getXposition() + dirX, monsterList, player):
+                self.move(dirX, 0)
+                return 1
+        elif self.checkValidMove(self.getYposition() + dirY, self.getXposition(), monsterList, player):
+                self.move(0, dirY)
+                return 1
+    else:
+         return -1
+
+class ReferencePlayer(Player):
+    """The player, moving with the original checkValidMove"""
+
+    __slots__ = ()
+
+    checkValidMove = checkValidMove
+
+class ReferenceMonster(Monster):
+    """A monster, moving with the original checkValidMove and findPlayer"""
+
+    __slots__ = ()
+
+    checkValidMove = checkValidMove
+    findPlayer = findPlayer
+
+def playerAttack(monsters, player, direction):
+    """The player attacks a monster. Calculate damage done to the monster
+       @param monsters: the list of monsters
+       @param player: the player object
+       @param direction: the attack direction
+       @return: a tuple with two values, the first value is a boolean which is true/false depending
+                on the monsters state after the attack (alive/dead). The second value is the damage done
+    """
+
+    if direction == 'D':
+        attackPosition = (player.getXposition(), player.getYposition() + 16)
+    elif direction == 'U':
+        attackPosition = (player.getXposition(), player.getYposition() - 16)
+    elif direction == 'L':
+        attackPosition = (player.getXposition() - 16, player.getYposition())
+    elif direction == 'R':
+        attackPosition = (player.getXposition() + 16, player.getYposition())
+
+    for m in monsters:
+        if m.getPosition() == attackPosition:
+            return calculateOutcome(m, player, monsters)
+
+    #Nothing to attack
+    return (False, 0)
+
+def calculateOutcome(monster, player, monsters):
+    """Calculate the outcome when a player attacks a monster
+       @param monster: the monster getting attacked
+       @param player: the player
+       @param monsters: the list of monsters
+       @return: a tuple with two values, the first value is a boolean which is true/false depending
+                on the monsters state after the attack (alive/dead). The second value is the damage done
+       """
+
+    #The damage done is the difference between the players attack power and the monsters armor
+    damageDone = player.getAttackPower() - monster.getArmor()
+    monster.decreaseHP(damageDone)
+    if monster.getHP() <= 0:
+        monsters.remove(monster)
+        return (True, damageDone) #monster died
+    else:
+        return (False, damageDone) #monster still lives
+
+def calculateOutcome2(player, monster):
+    """Calculate the outcome when a monster attacks a player
+       @param player: the player
+       @param monster: the monster
+       @return: the difference between the monsters attack power and the players armor
+    """
+
+    return monster.getAttackPower() - player.getArmor()
+
+def monsterAttack(monsters, player):
+    """The monsters attack the player
+       @param monsters: the list of monster objects
+       @param player: the player object
+       @return: a tuple with two values, the first value is a boolean which is true/false depending
+                on the player state after the attack (alive/dead). The second value is the damage done
+       """
+
+    damageDone = 0
+
+    #all monsters adjacent to the player attack
+    for m in monsters:
+
+        monsterPos = m.getPosition()
+
+        if playerIsAdjacent(m, player):
+            damageDone += calculateOutcome2(player, m)
+
+    #player loses HP
+    player.decreaseHP(damageDone)
+
+    return (player.getHP() <= 0, damageDone)
+
+def playerIsAdjacent(monster, player):
+    """Check if the player is adjacent to a monster
+       @param monster: the monster object
+       @param player: the player object
+       @return True if player is adjacent, false if not
+    """
+
+    if (monster.getXposition() + 16, monster.getYposition()) == player.getPosition() or \
+                (monster.getXposition() - 16, monster.getYposition()) == player.getPosition() or \
+                (monster.getXposition(), monster.getYposition() + 16) == player.getPosition() or \
+                (monster.getXposition(), monster.getYposition() - 16) == player.getPosition():
+        return True
+    else:
+         return False
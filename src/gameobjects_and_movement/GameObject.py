@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 
 import pygame, random
-from pygame.sprite import Sprite
 
 PIXELS = 16 #width and height of a tile
 
 DIRECTION = ['L', 'R', 'D', 'U'] #Left, right, down, up
 
-class GameObject(Sprite):
-    """A generic class for containing methods for the different game objects"""
+NORMAL_SPEED = 1.0 #actions per turn for the player and normal monsters
+
+class GameObject(object):
+    """A generic class for containing methods for the different game objects.
+       The game objects use __slots__ so they are small, and are reused between levels by an ObjectPool
+    """
+
+    __slots__ = ('screen', 'object_image', 'cave', 'position')
 
     def __init__(self, screen, position, object_image, object_cave):
         """ Constructor
@@ -60,21 +65,23 @@ class GameObject(Sprite):
            """
 
         #Is this tile a wall, True if not, False if it is a wall
-        if self.cave[y/16][x/16].isPassable():
+        if self.cave[y/PIXELS][x/PIXELS].isPassable():
             return (x, y)
         else:
-            return self.legalStartPosition(random.randrange(0, len(self.cave[0])*16, 16), random.randrange(0,
-                        len(self.cave)*16, 16))
+            return self.legalStartPosition(random.randrange(0, len(self.cave[0])*PIXELS, PIXELS), random.randrange(0,
+                        len(self.cave)*PIXELS, PIXELS))
 
 class MovableCharacter(GameObject):
     """Class for movable objects"""
 
+    __slots__ = ('speed', 'hitPoints', 'armor', 'attackPower')
+
     def __init__(self, screen, position, object_image, object_cave, dungeon_level):
         """Constructor
            send all parameters to super-class GameObject
         """
         super(MovableCharacter, self).__init__(screen, position, object_image, object_cave)
-
+        self.speed = NORMAL_SPEED
 
     def move(self, x, y):
         """Monsters and the player can move around"""
@@ -98,6 +105,12 @@ class MovableCharacter(GameObject):
         """
         return self.attackPower
 
+    def getSpeed(self):
+        """Get speed
+           @return: number of actions per turn for monster or player
+        """
+        return self.speed
+
     def increaseHP(self, amount):
         """Increase hitpoint with value of amount
         """
@@ -141,6 +154,8 @@ class MovableCharacter(GameObject):
 class Player(MovableCharacter):
     """Class for playable character"""
 
+    __slots__ = ()
+
     def __init__(self, screen, position, object_image, object_cave, dungeon_level):
         """Constructor
            send all parameters to super-class MovableCharacter
@@ -170,16 +185,26 @@ class Player(MovableCharacter):
 class Monster(MovableCharacter):
     """A class for monsters/enemies"""
 
-    def __init__(self, screen, position, object_image, object_cave, dungeon_level):
+    __slots__ = ('direction', 'spellRange')
+
+    def __init__(self, screen, position, object_image, object_cave, dungeon_level, speed=NORMAL_SPEED, spell_range=0):
         """Constructor
-           Send all parameters to super-class MovableCharacter
+           Send all parameters except speed and spell range to super-class MovableCharacter
         """
         super(Monster, self).__init__(screen, position, object_image, object_cave, dungeon_level)
+        self.speed = speed
+        self.spellRange = spell_range   #spellcasters can hit the player from this many tiles, 0 for no spells
         self.direction = DIRECTION[random.randint(0, len(DIRECTION)-1)]
         self.hitPoints = 25 + (dungeon_level*4) #HP
         self.armor = 2 + (dungeon_level * 2)  #Armor reduces damage taken
         self.attackPower = 6 + (dungeon_level*2)  #Attackpower increases damage done
 
+    def getSpellRange(self):
+        """Get spell range
+           @return: the range of the monsters spells in tiles, 0 if it can't cast spells
+        """
+        return self.spellRange
+
     def walk(self, monsterList, player):
         """Move a monster in a random direction, if it hit a wall or another monster, we choose a new random direction
         """
@@ -249,6 +274,8 @@ class Monster(MovableCharacter):
 class Item(GameObject):
     """Class for items"""
 
+    __slots__ = ('itemName', 'itemValue')
+
     def __init__(self, screen, position, object_image, object_cave, name, value):
         """Constructor
            Send all parameter except name and value to super-class GameObject
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+    Keeps track of which monsters are close enough to the player to be simulated.
+    The map is divided into square regions of REGION_SIZE tiles. Monsters in the regions
+    around the player are awake, all other monsters sleep and cost nothing per turn.
+    When the player comes near a sleeping monster it wakes up and is moved a few random
+    tiles, to make up for the turns it slept through. Sleeping monsters are taken out of
+    the turn scheduler, and put back in when they wake up.
+"""
+
+import random
+from src.gameobjects_and_movement.GameObject import PIXELS
+
+REGION_SIZE = 8      #width and height of a region in tiles
+ACTIVITY_RADIUS = 2  #monsters this many regions (or less) from the players region are awake
+MAX_JITTER = 4       #the max number of tiles a monster can drift while sleeping
+
+class ActivityIndex:
+    """Spatial index of monsters, divided into regions"""
+
+    def __init__(self, monsters, scheduler):
+        """Constructor. All monsters start out sleeping
+           @param monsters: list of monsters
+           @param scheduler: the turn scheduler
+        """
+        self.scheduler = scheduler
+        self.regions = {}     #region -> list of monsters in that region
+        self.sleepingSince = {}  #sleeping monster -> the turn it fell asleep
+        self.awake = set()
+        self.turn = 0
+
+        for m in monsters:
+            self.add(m)
+
+    def regionOf(self, position):
+        """Get the region a position belongs to
+           @param position: tuple of x and y coordinate (in pixels)
+           @return: tuple representing the region
+        """
+        return (position[0] / PIXELS / REGION_SIZE, position[1] / PIXELS / REGION_SIZE)
+
+    def add(self, monster):
+        """Add a sleeping monster to the index
+           @param monster: the monster to add
+        """
+        self.regions.setdefault(self.regionOf(monster.getPosition()), []).append(monster)
+        self.sleepingSince[monster] = self.turn
+
+    def moved(self, monster, oldPosition):
+        """Must be called when a monster has moved, so it is placed in the correct region
+           @param monster: the monster that moved
+           @param oldPosition: the position before the monster moved
+        """
+        oldRegion = self.regionOf(oldPosition)
+        newRegion = self.regionOf(monster.getPosition())
+
+        if oldRegion != newRegion:
+            self.regions[oldRegion].remove(monster)
+            self.regions.setdefault(newRegion, []).append(monster)
+
+    def monstersNear(self, position, radius):
+        """Get the living monsters in the regions around a position
+           @param position: tuple of x and y coordinate (in pixels)
+           @param radius: number of regions to look in each direction
+           @return: list of monsters
+        """
+        regionX, regionY = self.regionOf(position)
+        found = []
+
+        for y in range(regionY - radius, regionY + radius + 1):
+            for x in range(regionX - radius, regionX + radius + 1):
+                monsters = self.regions.get((x, y))
+                if not monsters:
+                    continue
+
+                #Dead monsters are removed lazily
+                for m in monsters[:]:
+                    if m.getHP() <= 0:
+                        monsters.remove(m)
+                        self.sleepingSince.pop(m, None)
+                        self.awake.discard(m)
+                        self.scheduler.remove(m)
+                    else:
+                        found.append(m)
+
+        return found
+
+    def update(self, player):
+        """Start a new turn. Wake up the monsters near the player, and put the rest to sleep
+           @param player: the player object
+           @return: list of the monsters an awake monster can bump into (the awake ones and their neighbours)
+        """
+        self.turn += 1
+
+        active = self.monstersNear(player.getPosition(), ACTIVITY_RADIUS)
+        nearby = self.monstersNear(player.getPosition(), ACTIVITY_RADIUS + 1)
+
+        #Monsters that were awake last turn but are no longer near fall asleep
+        activeSet = set(active)
+        for m in self.awake - activeSet:
+            if m.getHP() > 0:
+                self.sleepingSince[m] = self.turn
+            self.scheduler.remove(m)
+        self.awake = activeSet
+
+        for m in active:
+            if m in self.sleepingSince:
+                self.wake(m, nearby, player)
+
+        return nearby
+
+    def wake(self, monster, nearby, player):
+        """Wake up a sleeping monster. Instead of simulating every turn it slept through,
+           move it a random distance based on how long it slept
+           @param monster: the monster to wake up
+           @param nearby: list of monsters it can collide with
+           @param player: the player object
+        """
+        skipped = self.turn - self.sleepingSince.pop(monster)
+        self.scheduler.wake(monster)
+        drift = min(skipped, MAX_JITTER)
+
+        if drift > 0:
+            x = monster.getXposition() + random.randint(-drift, drift) * PIXELS
+            y = monster.getYposition() + random.randint(-drift, drift) * PIXELS
+
+            #Stay put if the new position is outside the map, a wall or taken
+            if 0 <= y / PIXELS < len(monster.cave) and 0 <= x / PIXELS < len(monster.cave[0]) and \
+                    monster.checkValidMove(y, x, nearby, player):
+                oldPosition = monster.getPosition()
+                monster.position = (x, y)
+                self.moved(monster, oldPosition)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+    Distance maps ("Dijkstra maps") used for auto-explore, travel and placing things on a new level.
+    A distance map holds, for each tile, the number of steps to the nearest goal tile. Walking
+    downhill on the map leads to a goal, so each step is a lookup of the four neighbours. The map is
+    built with a breadth first search, and after that it is updated incrementally: when goals are
+    added or tiles become passable only the tiles that get closer are visited, and when goals are
+    removed only the tiles that used those goals are searched again.
+
+    The auto-explore map only covers the explored part of the cave, and grows as tiles are revealed.
+    Travelling to a clicked tile uses an A* search over the same tiles, which stops when it reaches
+    the target and gives a path map that is followed like a distance map.
+"""
+
+import heapq
+from array import array
+from collections import deque
+
+UNREACHABLE = 2**30 #distance to tiles with no path to a goal
+
+class DistanceMap:
+    """Number of steps from each tile to the nearest goal"""
+
+    def __init__(self, cave, goals, passable=None):
+        """Constructor. Build the map with a breadth first search from all goals
+           @param cave: the map
+           @param goals: list of tuples with the x and y index of the goal tiles
+           @param passable: bytearray with 1 for each tile that is part of the map, default is the ground tiles
+        """
+        self.width = len(cave[0])
+        self.height = len(cave)
+
+        #Tiles are stored in flat arrays, tile (x, y) has index y * width + x
+        if passable is None:
+            passable = bytearray(1 if tile.isPassable() else 0 for row in cave for tile in row)
+        self.passable = passable
+        self.goal = bytearray(self.width * self.height)
+        self.dist = array('i', [UNREACHABLE]) * (self.width * self.height)
+
+        queue = deque()
+        for x, y in goals:
+            index = y * self.width + x
+            if self.passable[index] and not self.goal[index]:
+                self.goal[index] = 1
+                self.dist[index] = 0
+                queue.append(index)
+
+        dist = self.dist
+        passable = self.passable
+        while queue:
+            index = queue.popleft()
+            for neighbour in self.neighbours(index):
+                if passable[neighbour] and dist[neighbour] == UNREACHABLE:
+                    dist[neighbour] = dist[index] + 1
+                    queue.append(neighbour)
+
+    def neighbours(self, index):
+        """Get the tiles next to a tile. The cave border is always wall, so no bounds checks are needed
+           for passable tiles
+           @param index: the tile index
+           @return: list of the indexes of the four adjacent tiles
+        """
+        return (index - 1, index + 1, index - self.width, index + self.width)
+
+    def distance(self, x, y):
+        """Get the distance from a tile to the nearest goal
+           @param x: tile x index
+           @param y: tile y index
+           @return: number of steps, or UNREACHABLE
+        """
+        return self.dist[y * self.width + x]
+
+    def nextStep(self, x, y, isFree):
+        """Find the next step towards the nearest goal
+           @param x: tile x index to start from
+           @param y: tile y index to start from
+           @param isFree: function that checks if a tile can be stepped on right now (no monster there)
+           @return: tuple with the x and y index of the next tile, or None if there is no step closer to a goal
+        """
+        index = y * self.width + x
+        best = None
+        bestDistance = self.dist[index]
+
+        for neighbour in self.neighbours(index):
+            if self.passable[neighbour] and self.dist[neighbour] < bestDistance:
+                stepX, stepY = neighbour % self.width, neighbour / self.width
+                if isFree(stepX, stepY):
+                    best = (stepX, stepY)
+                    bestDistance = self.dist[neighbour]
+
+        return best
+
+    def addGoals(self, goals):
+        """Add goal tiles. Only tiles that get closer to a goal are updated
+           @param goals: list of tuples with the x and y index of the new goals
+        """
+        seeds = []
+        for x, y in goals:
+            index = y * self.width + x
+            if self.passable[index] and not self.goal[index]:
+                self.goal[index] = 1
+                self.dist[index] = 0
+                seeds.append(index)
+
+        self.relax(seeds)
+
+    def addPassable(self, x, y):
+        """Update the map after a wall has been dug down
+           @param x: tile x index
+           @param y: tile y index
+        """
+        index = y * self.width + x
+        if self.passable[index]:
+            return
+
+        self.passable[index] = 1
+        if not self.goal[index]:
+            for neighbour in self.neighbours(index):
+                if self.passable[neighbour] and self.dist[neighbour] + 1 < self.dist[index]:
+                    self.dist[index] = self.dist[neighbour] + 1
+
+        self.relax([index])
+
+    def removeGoals(self, goals):
+        """Remove goal tiles. The tiles whose shortest path went to one of those goals are found
+           and their distances are calculated again from the tiles around them
+           @param goals: list of tuples with the x and y index of the goals to remove
+        """
+        dist = self.dist
+        passable = self.passable
+        goal = self.goal
+
+        #Find the affected tiles, in order of increasing distance. A tile is affected if all its
+        #neighbours one step closer to a goal are affected
+        affected = set()
+        queue = deque()
+        for x, y in goals:
+            index = y * self.width + x
+            if goal[index]:
+                goal[index] = 0
+                affected.add(index)
+                queue.append(index)
+
+        while queue:
+            index = queue.popleft()
+            for neighbour in self.neighbours(index):
+                if passable[neighbour] and not goal[neighbour] and neighbour not in affected and \
+                        dist[neighbour] == dist[index] + 1:
+                    supported = False
+                    for other in self.neighbours(neighbour):
+                        if passable[other] and other not in affected and dist[other] == dist[neighbour] - 1:
+                            supported = True
+                            break
+                    if not supported:
+                        affected.add(neighbour)
+                        queue.append(neighbour)
+
+        #Give the affected tiles the best distance through an unaffected neighbour, then spread it
+        heap = []
+        for index in affected:
+            best = UNREACHABLE
+            for neighbour in self.neighbours(index):
+                if passable[neighbour] and neighbour not in affected and dist[neighbour] + 1 < best:
+                    best = dist[neighbour] + 1
+            dist[index] = best
+            if best < UNREACHABLE:
+                heap.append((best, index))
+
+        heapq.heapify(heap)
+        while heap:
+            distance, index = heapq.heappop(heap)
+            if distance != dist[index]:
+                continue
+            for neighbour in self.neighbours(index):
+                if passable[neighbour] and distance + 1 < dist[neighbour]:
+                    dist[neighbour] = distance + 1
+                    heapq.heappush(heap, (distance + 1, neighbour))
+
+    def relax(self, seeds):
+        """Spread lower distances out from the seed tiles, with a breadth first search that stops
+           at tiles that already are as close to a goal
+           @param seeds: indexes of the tiles whose distance was lowered
+        """
+        dist = self.dist
+        passable = self.passable
+        queue = deque(seeds)
+
+        while queue:
+            index = queue.popleft()
+            for neighbour in self.neighbours(index):
+                if passable[neighbour] and dist[index] + 1 < dist[neighbour]:
+                    dist[neighbour] = dist[index] + 1
+                    queue.append(neighbour)
+
+class ExploreMap(DistanceMap):
+    """Distance map for auto-explore. The goals are the items and the unexplored ground tiles next
+       to the explored ones. Only the explored ground tiles and the goals are part of the map, so the
+       map starts out empty and grows as the player explores, and it never searches the unexplored cave
+    """
+
+    def __init__(self, cave, items):
+        """Constructor. Made when a level is made, before anything is explored
+           @param cave: the map
+           @param items: list of tuples with the x and y index of the item tiles
+        """
+        self.cave = cave
+        self.items = set(items)
+
+        passable = bytearray(len(cave) * len(cave[0]))
+        for x, y in self.items:
+            passable[y * len(cave[0]) + x] = 1
+
+        DistanceMap.__init__(self, cave, self.items, passable)
+
+    def reveal(self, tiles, explored):
+        """Update the map after tiles have been explored. The revealed ground tiles become part of the
+           map and are no longer goals, and the unexplored ground tiles next to them become goals
+           @param tiles: list of tuples with the x and y index of the revealed tiles
+           @param explored: the explored map
+        """
+        cave = self.cave
+        passable = self.passable
+        width = self.width
+        frontier = []
+
+        for x, y in tiles:
+            #The cave border is always wall, so the neighbours of ground tiles are inside the map
+            if cave[y][x].isPassable():
+                self.addPassable(x, y)
+
+                for neighbour in self.neighbours(y * width + x):
+                    neighbourX, neighbourY = neighbour % width, neighbour / width
+                    if not passable[neighbour] and cave[neighbourY][neighbourX].isPassable() and \
+                            not explored.isExplored(neighbourX, neighbourY):
+                        passable[neighbour] = 1
+                        frontier.append((neighbourX, neighbourY))
+
+        self.addGoals(frontier)
+        self.removeGoals([tile for tile in tiles if tile not in self.items])
+
+    def found(self, x, y):
+        """Stop looking for an item, like when the player is standing on it
+           @param x: tile x index
+           @param y: tile y index
+        """
+        self.items.discard((x, y))
+        self.removeGoals([(x, y)])
+
+class PathMap:
+    """Number of steps to the goal for each tile on a path"""
+
+    def __init__(self, width, parent, goal):
+        """Constructor
+           @param width: width of the map in tiles
+           @param parent: dict from each searched tile index to the tile it was reached from, None for the start
+           @param goal: index of the goal tile
+        """
+        self.width = width
+        self.goal = (goal % width, goal / width)
+
+        path = []
+        index = goal
+        while index is not None:
+            path.append(index)
+            index = parent[index]
+
+        #the path is traced back from the goal, so the goal is first
+        self.dist = dict((index, distance) for distance, index in enumerate(path))
+
+    def distance(self, x, y):
+        """Get the distance from a tile to the goal
+           @param x: tile x index
+           @param y: tile y index
+           @return: number of steps, or UNREACHABLE if the tile is not on the path
+        """
+        return self.dist.get(y * self.width + x, UNREACHABLE)
+
+    def nextStep(self, x, y, isFree):
+        """Find the next step on the path
+           @param x: tile x index to start from
+           @param y: tile y index to start from
+           @param isFree: function that checks if a tile can be stepped on right now (no monster there)
+           @return: tuple with the x and y index of the next tile, or None if the goal is reached, the tile is
+                    not on the path or the next tile is not free
+        """
+        index = y * self.width + x
+        distance = self.dist.get(index)
+        if not distance:
+            return None
+
+        for neighbour in (index - 1, index + 1, index - self.width, index + self.width):
+            if self.dist.get(neighbour) == distance - 1:
+                stepX, stepY = neighbour % self.width, neighbour / self.width
+                if isFree(stepX, stepY):
+                    return (stepX, stepY)
+
+        return None
+
+def findPath(passable, width, start, goal, maxSteps):
+    """Find the shortest path between two tiles with an A* search. The search stops when it
+       reaches the goal, so only the tiles between the start and the goal are visited.
+       Travel only goes through explored tiles, so the auto-explore map's passable array is used.
+       The cave border is always wall, so no bounds checks are needed
+       @param passable: bytearray with 1 for each tile that can be walked on, like DistanceMap.passable
+       @param width: map width in tiles
+       @param start: tuple with the x and y index of the start tile
+       @param goal: tuple with the x and y index of the goal tile
+       @param maxSteps: paths longer than this are not looked for
+       @return: a PathMap, or None if there is no path
+    """
+    goalX, goalY = goal
+    startIndex = start[1] * width + start[0]
+    goalIndex = goalY * width + goalX
+
+    if not passable[goalIndex]:
+        return None
+
+    parent = {startIndex: None}
+    dist = {startIndex: 0}
+
+    #Each step changes the estimated path length (steps walked + manhattan distance left) by 0 or 2,
+    #so two lists are enough instead of a heap: tiles with the current estimate, and tiles with the
+    #next one. The current list is used as a stack, so the search goes straight for the goal in open caves
+    estimate = abs(goalX - start[0]) + abs(goalY - start[1])
+    current = [startIndex]
+    later = []
+
+    while estimate <= maxSteps:
+        while current:
+            index = current.pop()
+            if index == goalIndex:
+                return PathMap(width, parent, goalIndex)
+
+            distance = dist[index] + 1
+            x, y = index % width, index / width
+            for neighbour, closer in ((index - 1, x > goalX), (index + 1, x < goalX),
+                                      (index - width, y > goalY), (index + width, y < goalY)):
+                if passable[neighbour] and distance < dist.get(neighbour, UNREACHABLE):
+                    dist[neighbour] = distance
+                    parent[neighbour] = index
+                    if closer:
+                        current.append(neighbour)
+                    else:
+                        later.append(neighbour)
+
+        if not later:
+            break
+        current, later = later, []
+        estimate += 2
+
+    return None
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+    Places the player, the door, items and monsters on a new level. The player starts on a random tile
+    in the largest open region of the cave, so it can't be shut in a small pocket. One breadth first
+    search is made from the players start tile, and the tiles the player can walk to are sorted by
+    their distance from it. The door is put at least a given distance away, items are spread out from
+    near to far, and monsters are never closer than a safe distance to the player. Everything is picked
+    directly from the sorted tiles, so there are no retries and the cost is linear in the size of the map.
+"""
+
+import random
+from bisect import bisect_left
+from src.gameobjects_and_movement import distancemap
+from src.gameobjects_and_movement.GameObject import PIXELS
+
+def largestRegion(passable, width):
+    """Find the largest group of ground tiles that are connected to each other
+       @param passable: bytearray with 1 for each ground tile, tile (x, y) has index y * width + x
+       @param width: map width in tiles
+       @return: list of the tile indexes in the region
+    """
+
+    seen = bytearray(len(passable))
+    largest = []
+
+    for first in range(len(passable)):
+        if passable[first] and not seen[first]:
+            #Breadth first search, the region list is the queue. The cave border is always wall
+            seen[first] = 1
+            region = [first]
+            for index in region:
+                for neighbour in (index - 1, index + 1, index - width, index + width):
+                    if passable[neighbour] and not seen[neighbour]:
+                        seen[neighbour] = 1
+                        region.append(neighbour)
+
+            if len(region) > len(largest):
+                largest = region
+
+    return largest
+
+class Placement:
+    """The tiles that can be reached from the players start tile, sorted by distance"""
+
+    def __init__(self, cave):
+        """Constructor. The players start tile is picked at random in the largest region of the cave
+           @param cave: the map
+        """
+        width = len(cave[0])
+        passable = bytearray(1 if tile.isPassable() else 0 for row in cave for tile in row)
+
+        start = random.choice(largestRegion(passable, width))
+        distanceMap = distancemap.DistanceMap(cave, [(start % width, start / width)], passable)
+
+        self.width = width
+        self.distanceMap = distanceMap
+
+        #Sort the reachable tiles by distance with a counting sort
+        byDistance = []
+        for index, distance in enumerate(distanceMap.dist):
+            if distance != distancemap.UNREACHABLE:
+                while len(byDistance) <= distance:
+                    byDistance.append([])
+                byDistance[distance].append(index)
+
+        self.order = [index for tiles in byDistance for index in tiles]
+        self.distances = [distance for distance, tiles in enumerate(byDistance) for index in tiles]
+        self.taken = set([self.order[0]]) #tiles that have been given out, starting with the players tile
+
+    def start(self):
+        """Get the players start position
+           @return: tuple of x and y coordinate (in pixels)
+        """
+        return self.position(self.order[0])
+
+    def position(self, index):
+        """Get the position of a tile
+           @param index: the tile index
+           @return: tuple of x and y coordinate (in pixels)
+        """
+        return ((index % self.width) * PIXELS, (index / self.width) * PIXELS)
+
+    def farTiles(self, minDistance):
+        """Get the tiles at least some distance from the start. If no tile is that far away,
+           the tiles furthest away are used
+           @param minDistance: min distance in steps
+           @return: list of tile indexes
+        """
+        first = bisect_left(self.distances, min(minDistance, self.distances[-1]))
+        return self.order[first:]
+
+    def unreachableTiles(self):
+        """Get the ground tiles the player can't walk to
+           @return: list of tile indexes
+        """
+        passable = self.distanceMap.passable
+        return [index for index, distance in enumerate(self.distanceMap.dist)
+                if passable[index] and distance == distancemap.UNREACHABLE]
+
+    def take(self, count, *choices):
+        """Pick random tiles that have not been given out yet, and mark them as taken.
+           When there are too few free tiles in the first list, the rest are picked from the next one
+           @param count: number of tiles to pick
+           @param choices: lists of tile indexes, or functions returning them, in the order they are used
+           @return: list of tile indexes. It is shorter than count if all the tiles are taken
+        """
+
+        chosen = []
+
+        for tiles in choices:
+            if len(chosen) == count:
+                break
+            if callable(tiles):
+                tiles = tiles()
+
+            free = [index for index in tiles if index not in self.taken]
+            picked = random.sample(free, min(count - len(chosen), len(free)))
+            self.taken.update(picked)
+            chosen.extend(picked)
+
+        return chosen
+
+    def door(self, minDistance):
+        """Find a tile for the door. Must be called before items and monsters are placed
+           @param minDistance: min number of steps from the player to the door
+           @return: the position of the door
+        """
+
+        #In a cave with only one ground tile the door is put on the player
+        chosen = self.take(1, self.farTiles(minDistance), self.order, self.unreachableTiles) or self.order[:1]
+        return self.position(chosen[0])
+
+    def spread(self, count):
+        """Find tiles for items. The reachable tiles are split into bands by distance, and one tile is
+           picked in each band, so the items are spread out from near the player to far away
+           @param count: number of tiles to find
+           @return: list of positions, in random order
+        """
+
+        positions = []
+        size = len(self.order)
+
+        for band in range(count):
+            tiles = self.order[band * size / count:(band + 1) * size / count]
+
+            #Very small caves can have fewer free tiles than items, so items can share a tile
+            chosen = self.take(1, tiles, self.order, self.unreachableTiles) or [random.choice(self.order)]
+            positions.append(self.position(chosen[0]))
+
+        random.shuffle(positions)
+        return positions
+
+    def monsters(self, count, minDistance):
+        """Find tiles for monsters, one monster on each tile. If there are not enough free tiles far
+           away, the rest of the monsters are put in parts of the cave the player can't walk to.
+           No monster is put closer to the player, so small caves get fewer monsters
+           @param count: number of tiles to find
+           @param minDistance: min number of steps from the player to a monster
+           @return: list of positions. It is shorter than count if there are too few tiles
+        """
+
+        first = bisect_left(self.distances, minDistance)
+        chosen = self.take(count, self.order[first:], self.unreachableTiles)
+        return [self.position(index) for index in chosen]
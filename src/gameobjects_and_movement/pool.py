@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+    Object pool for game objects. Monsters and items are made again for every dungeon level,
+    so instead of throwing the old objects away they are given back to a pool and reused.
+"""
+
+class ObjectPool:
+    """Keeps objects that are no longer used, so they can be reused"""
+
+    def __init__(self, objectClass):
+        """Constructor
+           @param objectClass: the class of the objects in the pool
+        """
+        self.objectClass = objectClass
+        self.free = []
+        self.inUse = []
+
+    def acquire(self, *args, **kwargs):
+        """Get an object. A free object is reused if there is one, else a new object is made
+           @param args: the constructor parameters
+           @return: the object
+        """
+        if self.free:
+            obj = self.free.pop()
+            #run the constructor again to reset the old object
+            obj.__init__(*args, **kwargs)
+        else:
+            obj = self.objectClass(*args, **kwargs)
+
+        self.inUse.append(obj)
+        return obj
+
+    def releaseAll(self):
+        """Give back all objects in use, like when a level is finished. Objects removed from the
+           game during the level (killed monsters, picked up items) are given back as well
+        """
+        self.free.extend(self.inUse)
+        self.inUse = []
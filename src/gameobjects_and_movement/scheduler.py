@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+    Turn scheduler for the player and the monsters. Every actor has a time for its next action,
+    and the actors are kept in a heap sorted by that time. An actor with speed 2 gets to act
+    twice as often as one with speed 1. Actors that have nothing to do can be taken out of the
+    heap, and put back when something wakes them up.
+"""
+
+import heapq, itertools
+
+class TurnScheduler:
+    """Priority queue of actors, sorted by the time of their next action"""
+
+    def __init__(self):
+        """Constructor"""
+        self.heap = []
+        self.entries = {}               #actor -> its entry in the heap
+        self.counter = itertools.count()  #tie breaker, actors scheduled at the same time act in order
+        self.now = 0.0
+        self.removed = 0                #number of dead entries left in the heap
+
+    def schedule(self, actor, delay=None):
+        """Schedule the next action of an actor. If the actor is already scheduled, it is moved
+           @param actor: the player or a monster
+           @param delay: time until the action, default is one action at the actors speed
+        """
+        if delay is None:
+            delay = 1.0 / actor.getSpeed()
+
+        self.remove(actor)
+        entry = [self.now + delay, next(self.counter), actor]
+        self.entries[actor] = entry
+        heapq.heappush(self.heap, entry)
+
+    def wake(self, actor):
+        """Schedule an idle actor. Does nothing if the actor is already scheduled
+           @param actor: the actor to wake up
+        """
+        if actor not in self.entries:
+            self.schedule(actor)
+
+    def remove(self, actor):
+        """Take an actor out of the schedule, so it is idle until woken up.
+           The entry is left in the heap and skipped when it is popped
+           @param actor: the actor to remove
+        """
+        entry = self.entries.pop(actor, None)
+        if entry is not None:
+            entry[-1] = None
+            self.removed += 1
+
+            #Rebuild the heap when it is mostly dead entries, so it doesn't grow forever
+            if self.removed > 64 and self.removed > len(self.entries):
+                self.heap = [e for e in self.heap if e[-1] is not None]
+                heapq.heapify(self.heap)
+                self.removed = 0
+
+    def pop(self):
+        """Get the next actor to act and move the time forward to its action
+           @return: the actor, or None if no actors are scheduled
+        """
+        while self.heap:
+            time, count, actor = heapq.heappop(self.heap)
+            if actor is None:
+                self.removed -= 1
+            else:
+                del self.entries[actor]
+                self.now = time
+                return actor
+        return None
@@ -4,6 +4,30 @@
 """
 from pygame import Rect, font, Color
 
+TEXT_CACHE_SIZE = 64 #max number of rendered text surfaces to keep
+
+text_cache = {} #(text, color) -> rendered text surface
+fonts = {}
+
+def render_text(text, color):
+    """Render a line of text. The stats change rarely, so the rendered surfaces are cached
+       @param text: the text to render
+       @param color: name of the text color
+       @return: surface with the rendered text
+    """
+
+    if (text, color) not in text_cache:
+        if 'arial' not in fonts:
+            fonts['arial'] = font.SysFont('arial', 20)
+
+        #Throw away old text when the cache is full
+        if len(text_cache) >= TEXT_CACHE_SIZE:
+            text_cache.clear()
+
+        text_cache[(text, color)] = fonts['arial'].render(text, True, Color(color))
+
+    return text_cache[(text, color)]
+
 def make_stats_box(screen, player, dungeon_level, box_x_start, box_heigth, box_width):
     """Create the box displaying the stats
        @param screen: the screen to draw on
@@ -16,13 +40,11 @@ def make_stats_box(screen, player, dungeon_level, box_x_start, box_heigth, box_w
 
     #create the rectangle
     stats_box = Rect(box_x_start, 0, box_width, box_heigth)
-    #set font type
-    stats_font = font.SysFont('arial', 20)
     #render game info
-    player_HP = stats_font.render("Hit Points: " + str(player.getHP()), True, Color('white'))
-    player_AP = stats_font.render("Attack Power: " + str(player.getAttackPower()), True, Color('white'))
-    player_Armor = stats_font.render("Armor: " + str(player.getArmor()), True, Color('white'))
-    level = stats_font.render("Dungeon Level: " + str(dungeon_level), True, Color('white'))
+    player_HP = render_text("Hit Points: " + str(player.getHP()), 'white')
+    player_AP = render_text("Attack Power: " + str(player.getAttackPower()), 'white')
+    player_Armor = render_text("Armor: " + str(player.getArmor()), 'white')
+    level = render_text("Dungeon Level: " + str(dungeon_level), 'white')
 
     #For each line of text, draw it on the screen and move the rectangle for the next line
     screen.fill(Color('Black'), stats_box)
@@ -42,10 +64,8 @@ def make_message_box(screen, box_y_start, box_heigth, box_width, gameMessage):
 
     #Create rectangle
     message_box = Rect(0, box_y_start, box_width, box_heigth)
-    #set font type
-    message_font = font.SysFont('arial', 20)
     #render message
-    message = message_font.render(gameMessage, True, Color('White'))
+    message = render_text(gameMessage, 'white')
     #display
     screen.fill(Color('Black'), message_box)
     screen.blit(message, message_box)
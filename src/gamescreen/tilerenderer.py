@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+    Renders the cave. Instead of drawing every tile each frame, the whole map is drawn once
+    to a map surface when a level is made, and each frame only copies that surface to the screen.
+    The map surface is built from an index array of the cave (0 is wall, 1 is ground) and a tile
+    atlas with pygame.surfarray, so the full map is made in one numpy operation instead of one blit
+    per tile. If numpy is not installed, the tiles are blitted to the map surface one at a time.
+    The renderer also keeps a minimap of the explored parts of the cave.
+
+    The cave can be zoomed in. The tile images are scaled once for each zoom, and when zoomed in the
+    tiles around the view are drawn from the scaled atlas to a view surface, which is a few tiles
+    larger than the view. It is only drawn again when the view moves out of it, and then it is
+    scrolled and only the new tiles are drawn. So most frames are one blit, and the memory used
+    depends on the size of the view and not of the map. Sprite images are scaled once for each zoom
+    and kept in a cache too. Game objects keep their positions on the unzoomed PIXELS grid, only the
+    drawing is zoomed.
+"""
+
+import pygame
+from src.gameobjects_and_movement.GameObject import PIXELS
+
+try:
+    import numpy
+    from pygame import surfarray
+except ImportError:
+    numpy = None
+
+WALL = 0
+GROUND = 1
+
+ZOOM_LEVELS = [1, 2, 3] #a tile is PIXELS times the zoom wide and high
+VIEW_MARGIN = 4 #tiles drawn on each side of the view when zoomed in, so the view can move before drawing
+
+#Minimap colors for unexplored tiles, walls and ground
+MINIMAP_COLORS = [(0, 0, 0), (110, 110, 110), (150, 110, 60)]
+MINIMAP_PLAYER_COLOR = (255, 0, 0)
+
+class TileRenderer:
+    """Draws the cave, the game objects and the minimap"""
+
+    def __init__(self, screen, cave, viewWidth=None, viewHeight=None):
+        """Constructor
+           @param screen: the screen to draw on
+           @param cave: the map
+           @param viewWidth: width of the part of the screen showing the cave, default is the whole cave
+           @param viewHeight: height of the part of the screen showing the cave, default is the whole cave
+        """
+        self.screen = screen
+        self.viewWidth = viewWidth or len(cave[0]) * PIXELS
+        self.viewHeight = viewHeight or len(cave) * PIXELS
+        self.zoom = ZOOM_LEVELS[0]
+        self.camera = (0, 0)        #upper left corner of the view on the zoomed map surface
+        self.scaledImages = {}      #(image, zoom) -> the image scaled to that zoom, kept between levels
+        self.viewSurface = None     #the tiles around the view at the current zoom, when zoomed in
+        self.rebuild(cave)
+
+    def rebuild(self, cave):
+        """Draw the whole cave to the map surface. Called when a new level is made
+           @param cave: the map
+        """
+        self.cave = cave
+        self.height = len(cave)
+        self.width = len(cave[0])
+
+        #Find the index of each tile and the image used for walls and ground
+        self.atlas = [None, None]
+        index = []
+        for row in cave:
+            rowIndex = []
+            for tile in row:
+                tileType = GROUND if tile.isPassable() else WALL
+                if self.atlas[tileType] is None:
+                    self.atlas[tileType] = tile.tile_image
+                rowIndex.append(tileType)
+            index.append(rowIndex)
+
+        if numpy is not None and None not in self.atlas:
+            #surfarray indexes pixels as [x][y], so the index array is transposed to [x][y] as well
+            self.index = numpy.array(index, dtype=numpy.uint8).T
+        else:
+            self.index = None
+
+        self.atlasPixels = {}   #zoom -> pixels of the atlas images scaled to that zoom
+        self.viewTiles = None   #zoom and upper left tile of the view surface, None when it must be drawn again
+
+        self.mapSurface = pygame.Surface((self.width * PIXELS, self.height * PIXELS)).convert()
+        self.drawTiles(self.mapSurface, 1, 0, 0, self.width, self.height)
+
+        #The minimap has one pixel per tile, and starts out unexplored
+        self.minimap = pygame.Surface((self.width, self.height)).convert()
+        self.minimap.fill(MINIMAP_COLORS[0])
+        self.scaledMinimap = None
+
+    def scaled(self, image, zoom):
+        """Get an image scaled to a zoom. Each image is only scaled once for each zoom
+           @param image: the unzoomed image
+           @param zoom: the zoom
+           @return: the scaled image
+        """
+        if zoom == 1:
+            return image
+
+        scaledImage = self.scaledImages.get((image, zoom))
+        if scaledImage is None:
+            width, height = image.get_size()
+            scaledImage = pygame.transform.scale(image, (width * zoom, height * zoom))
+            self.scaledImages[(image, zoom)] = scaledImage
+
+        return scaledImage
+
+    def drawTiles(self, surface, zoom, left, top, columns, rows):
+        """Draw a rectangle of tiles, scaled to a zoom, to a surface of the same size
+           @param surface: the surface to draw on
+           @param zoom: the zoom
+           @param left: x index of the upper left tile
+           @param top: y index of the upper left tile
+           @param columns: number of tiles across
+           @param rows: number of tiles down
+        """
+        size = PIXELS * zoom
+
+        if self.index is not None:
+            atlasPixels = self.atlasPixels.get(zoom)
+            if atlasPixels is None:
+                atlasPixels = numpy.array([surfarray.array3d(self.scaled(image, zoom)) for image in self.atlas])
+                self.atlasPixels[zoom] = atlasPixels
+
+            #(columns, rows, size, size, 3) -> (columns, size, rows, size, 3) -> (columns*size, rows*size, 3)
+            tilePixels = atlasPixels[self.index[left:left + columns, top:top + rows]].transpose(0, 2, 1, 3, 4)
+            surfarray.blit_array(surface, tilePixels.reshape(columns * size, rows * size, 3))
+        else:
+            for y in range(top, top + rows):
+                for x in range(left, left + columns):
+                    surface.blit(self.scaled(self.cave[y][x].tile_image, zoom), ((x - left) * size, (y - top) * size))
+
+    def drawView(self, left, top):
+        """Draw the tiles around the view to the view surface at the current zoom. The surface has
+           VIEW_MARGIN tiles on each side of the view, and one more tile than fits in the view, since the
+           camera can be inside a tile. When the camera has moved a few tiles, the surface is scrolled
+           and only the new tiles are drawn
+           @param left: x index of the tile at the left edge of the view
+           @param top: y index of the tile at the top edge of the view
+        """
+        size = PIXELS * self.zoom
+        columns = min(self.viewWidth / size + 2 + 2 * VIEW_MARGIN, self.width)
+        rows = min(self.viewHeight / size + 2 + 2 * VIEW_MARGIN, self.height)
+        left = max(0, min(left - VIEW_MARGIN, self.width - columns))
+        top = max(0, min(top - VIEW_MARGIN, self.height - rows))
+
+        #The surface is only made again when the zoom changes
+        if self.viewSurface is None or self.viewSurface.get_size() != (columns * size, rows * size):
+            self.viewSurface = pygame.Surface((columns * size, rows * size)).convert()
+            self.viewTiles = None
+
+        if self.viewTiles is not None and self.viewTiles[0] == self.zoom:
+            moveX = left - self.viewTiles[1]
+            moveY = top - self.viewTiles[2]
+        else:
+            moveX = moveY = columns
+
+        if abs(moveX) < columns and abs(moveY) < rows:
+            self.viewSurface.scroll(-moveX * size, -moveY * size)
+
+            #the new columns are at the right edge when moving right, and at the left edge when moving left
+            if moveX:
+                first = columns - moveX if moveX > 0 else 0
+                strip = self.viewSurface.subsurface(pygame.Rect(first * size, 0, abs(moveX) * size, rows * size))
+                self.drawTiles(strip, self.zoom, left + first, top, abs(moveX), rows)
+            if moveY:
+                first = rows - moveY if moveY > 0 else 0
+                strip = self.viewSurface.subsurface(pygame.Rect(0, first * size, columns * size, abs(moveY) * size))
+                self.drawTiles(strip, self.zoom, left, top + first, columns, abs(moveY))
+        else:
+            self.drawTiles(self.viewSurface, self.zoom, left, top, columns, rows)
+
+        self.viewTiles = (self.zoom, left, top)
+
+    def setZoom(self, zoom):
+        """Change the zoom
+           @param zoom: one of ZOOM_LEVELS
+        """
+        self.zoom = zoom
+
+    def changeZoom(self, steps):
+        """Zoom in or out
+           @param steps: number of zoom levels to zoom in, negative to zoom out
+           @return: the new zoom
+        """
+        level = ZOOM_LEVELS.index(self.zoom) + steps
+        self.setZoom(ZOOM_LEVELS[max(0, min(level, len(ZOOM_LEVELS) - 1))])
+        return self.zoom
+
+    def updateTile(self, tile, explored):
+        """Redraw one tile after it has changed, like when a wall is dug down
+           @param tile: the tile that changed
+           @param explored: the explored map
+        """
+        x = tile.getXposition() / PIXELS
+        y = tile.getYposition() / PIXELS
+        tileType = GROUND if tile.isPassable() else WALL
+
+        if self.index is not None:
+            self.index[x][y] = tileType
+        self.mapSurface.blit(tile.tile_image, tile.position)
+
+        #Draw the tile to the view surface too. If it is not in the view, the blit is clipped away
+        if self.viewTiles is not None:
+            zoom, left, top = self.viewTiles
+            size = PIXELS * zoom
+            self.viewSurface.blit(self.scaled(tile.tile_image, zoom), ((x - left) * size, (y - top) * size))
+
+        if explored.isExplored(x, y):
+            self.minimap.set_at((x, y), MINIMAP_COLORS[tileType + 1])
+            self.scaledMinimap = None
+
+    def reveal(self, tiles):
+        """Show newly explored tiles on the minimap
+           @param tiles: list of tuples with the x and y index of the tiles
+        """
+        for x, y in tiles:
+            tileType = GROUND if self.cave[y][x].isPassable() else WALL
+            self.minimap.set_at((x, y), MINIMAP_COLORS[tileType + 1])
+
+        if tiles:
+            self.scaledMinimap = None
+
+    def draw(self, player):
+        """Draw the cave on the screen, with the view centered on the player when zoomed in
+           @param player: the player object
+        """
+        size = PIXELS * self.zoom
+        mapWidth, mapHeight = self.width * size, self.height * size
+
+        #Keep the player in the middle, but don't show anything outside the map
+        cameraX = player.getXposition() * self.zoom + size / 2 - self.viewWidth / 2
+        cameraY = player.getYposition() * self.zoom + size / 2 - self.viewHeight / 2
+        self.camera = (max(0, min(cameraX, mapWidth - self.viewWidth)), max(0, min(cameraY, mapHeight - self.viewHeight)))
+
+        if self.zoom == 1:
+            self.screen.blit(self.mapSurface, (0, 0), pygame.Rect(self.camera, (self.viewWidth, self.viewHeight)))
+            return
+
+        #The view surface is only drawn again when the zoom changes or the view moves out of it
+        left, top = self.camera[0] / size, self.camera[1] / size
+        right = min((self.camera[0] + self.viewWidth - 1) / size + 1, self.width)
+        bottom = min((self.camera[1] + self.viewHeight - 1) / size + 1, self.height)
+
+        if self.viewTiles is None or self.viewTiles[0] != self.zoom or \
+                not self.viewTiles[1] <= left <= right <= self.viewTiles[1] + self.viewSurface.get_width() / size or \
+                not self.viewTiles[2] <= top <= bottom <= self.viewTiles[2] + self.viewSurface.get_height() / size:
+            self.drawView(left, top)
+
+        viewLeft, viewTop = self.viewTiles[1:]
+        self.screen.blit(self.viewSurface, (0, 0), pygame.Rect(self.camera[0] - viewLeft * size,
+                                                                self.camera[1] - viewTop * size,
+                                                                self.viewWidth, self.viewHeight))
+
+    def drawObject(self, gameObject):
+        """Draw a game object at the current zoom. Objects outside the view are not drawn
+           @param gameObject: the player, a monster or an item
+        """
+        x = gameObject.getXposition() * self.zoom - self.camera[0]
+        y = gameObject.getYposition() * self.zoom - self.camera[1]
+        size = PIXELS * self.zoom
+
+        if -size < x < self.viewWidth and -size < y < self.viewHeight:
+            self.screen.blit(self.scaled(gameObject.object_image, self.zoom), (x, y))
+
+    def tileAt(self, position):
+        """Find the tile shown at a position on the screen, like where the mouse was clicked
+           @param position: tuple of x and y coordinate on the screen
+           @return: tuple with the x and y index of the tile
+        """
+        size = PIXELS * self.zoom
+        return ((position[0] + self.camera[0]) / size, (position[1] + self.camera[1]) / size)
+
+    def drawMinimap(self, player, x, y, width):
+        """Draw the minimap, scaled to fit the given width
+           @param player: the player object
+           @param x: upper left corner x-coordinate
+           @param y: upper left corner y-coordinate
+           @param width: width of the minimap in pixels
+        """
+        scale = float(width) / self.width
+
+        #Only scale the minimap again when something new has been explored
+        if self.scaledMinimap is None:
+            self.scaledMinimap = pygame.transform.scale(self.minimap, (width, int(self.height * scale)))
+
+        self.screen.blit(self.scaledMinimap, (x, y))
+
+        playerX = x + int(player.getXposition() / PIXELS * scale)
+        playerY = y + int(player.getYposition() / PIXELS * scale)
+        self.screen.fill(MINIMAP_PLAYER_COLOR, pygame.Rect(playerX, playerY, max(2, int(scale)), max(2, int(scale))))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+    Keeps track of the parts of the cave the player has seen.
+"""
+
+VIEW_RADIUS = 6 #the player sees this many tiles in each direction
+
+class ExploredMap:
+    """Explored/unexplored flag for each tile in the cave"""
+
+    def __init__(self, width, height):
+        """Constructor. Nothing is explored at the start
+           @param width: map width in tiles
+           @param height: map height in tiles
+        """
+        self.width = width
+        self.height = height
+        self.explored = bytearray(width * height)
+
+    def isExplored(self, x, y):
+        """Check if a tile is explored
+           @param x: tile x index
+           @param y: tile y index
+           @return: True if the tile is explored, False if not
+        """
+        return self.explored[y * self.width + x] == 1
+
+    def reveal(self, x, y):
+        """Mark the tiles around a position as explored
+           @param x: tile x index of the player
+           @param y: tile y index of the player
+           @return: list of tuples with the x and y index of each newly explored tile
+        """
+        revealed = []
+
+        for tileY in range(max(0, y - VIEW_RADIUS), min(self.height, y + VIEW_RADIUS + 1)):
+            row = tileY * self.width
+            for tileX in range(max(0, x - VIEW_RADIUS), min(self.width, x + VIEW_RADIUS + 1)):
+                if not self.explored[row + tileX]:
+                    self.explored[row + tileX] = 1
+                    revealed.append((tileX, tileY))
+
+        return revealed
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+    Level generators that make a connected cave in one pass. Every generator takes the map size
+    in tiles and returns a grid, a bytearray with one value per tile row by row, where 1 is wall
+    and 0 is ground. The border of the grid is always wall.
+"""
+
+import random
+
+#Settings for the BSP generator
+BSP_MIN_LEAF = 10    #a part of the map smaller than this (in tiles) is not split again
+BSP_MIN_ROOM = 4     #smallest room width and height
+
+#Settings for the drunkard's walk generator
+DRUNKARD_FILL = 40   #percent of the tiles inside the border that are dug out
+DRUNKARD_WALK = 200  #number of steps before a new walk starts from a random dug tile
+
+def bspGrid(width, height):
+    """Rooms and corridors made by binary space partitioning. The map is split in two again and
+       again, a room is made in each part, and the rooms of the two halves of every split are joined
+       with a corridor, so all rooms are connected
+       @param width: map width in tiles
+       @param height: map height in tiles
+       @return: the grid
+    """
+
+    grid = bytearray(b'\x01') * (width * height)
+
+    def carve(x, y):
+        grid[y * width + x] = 0
+
+    def corridor(start, end):
+        """Dig an L-shaped corridor between two points"""
+        (x1, y1), (x2, y2) = start, end
+        for x in range(min(x1, x2), max(x1, x2) + 1):
+            carve(x, y1)
+        for y in range(min(y1, y2), max(y1, y2) + 1):
+            carve(x2, y)
+
+    def split(x, y, w, h):
+        """Make the rooms of an area
+           @return: a point inside one of the rooms, used to connect this area to another
+        """
+        canSplitX = w >= 2 * BSP_MIN_LEAF
+        canSplitY = h >= 2 * BSP_MIN_LEAF
+
+        #Make a room if the area is too small to split
+        if not canSplitX and not canSplitY:
+            roomW = random.randint(min(BSP_MIN_ROOM, w), w)
+            roomH = random.randint(min(BSP_MIN_ROOM, h), h)
+            roomX = x + random.randint(0, w - roomW)
+            roomY = y + random.randint(0, h - roomH)
+            for row in range(roomY, roomY + roomH):
+                grid[row * width + roomX:row * width + roomX + roomW] = b'\x00' * roomW
+            return (roomX + roomW / 2, roomY + roomH / 2)
+
+        #Split across the longest side
+        if canSplitX and (not canSplitY or w >= h):
+            cut = random.randint(BSP_MIN_LEAF, w - BSP_MIN_LEAF)
+            first = split(x, y, cut, h)
+            second = split(x + cut, y, w - cut, h)
+        else:
+            cut = random.randint(BSP_MIN_LEAF, h - BSP_MIN_LEAF)
+            first = split(x, y, w, cut)
+            second = split(x, y + cut, w, h - cut)
+
+        corridor(first, second)
+        return random.choice((first, second))
+
+    #Everything inside the border can be dug out
+    split(1, 1, width - 2, height - 2)
+
+    return grid
+
+def drunkardGrid(width, height):
+    """Cave dug out by a random walk. Every walk starts on a tile that is already dug out,
+       so the cave is always connected. Walks start next to undug tiles, so they don't spend
+       their steps inside the part of the cave that is already made
+       @param width: map width in tiles
+       @param height: map height in tiles
+       @return: the grid
+    """
+
+    grid = bytearray(b'\x01') * (width * height)
+    target = (width - 2) * (height - 2) * DRUNKARD_FILL / 100
+
+    position = (height / 2) * width + width / 2
+    grid[position] = 0
+    dug = 1
+    edge = [position]  #dug tiles that may have undug tiles next to them
+
+    steps = (-1, 1, -width, width)
+
+    def inside(index):
+        x = index % width
+        y = index / width
+        return 0 < x < width - 1 and 0 < y < height - 1
+
+    while dug < target:
+        #Pick a random tile on the edge of the cave. Tiles with no undug neighbours are thrown away,
+        #so each tile is looked at a few times at most
+        pick = random.randrange(len(edge))
+        position = edge[pick]
+        if not any(grid[position + step] and inside(position + step) for step in steps):
+            edge[pick] = edge[-1]
+            edge.pop()
+            continue
+
+        for step in range(DRUNKARD_WALK):
+            next = position + random.choice(steps)
+
+            #Stay inside the border
+            if not inside(next):
+                continue
+
+            position = next
+            if grid[position]:
+                grid[position] = 0
+                dug += 1
+                edge.append(position)
+
+    return grid
@@ -4,18 +4,57 @@
 """
 
 import pygame, sys, random, os, time
-from mapgenerator import mapgen
-from gameobjects_and_movement import GameObject
-from gamescreen import Gamescreen
-from battlesystem import battlecalc
+from src.mapgenerator import mapgen, exploration
+from src.gameobjects_and_movement import GameObject, activity as monsteractivity, scheduler as turnscheduler, pool, \
+    distancemap, placement as objectplacement
+from src.gameobjects_and_movement.GameObject import PIXELS
+from src.gamescreen import Gamescreen, tilerenderer
+from src.battlesystem import battlecalc, lineofsight
+from src.diagnostics import memreport
+from src.telemetry import events
 
 """Game constants"""
 MONSTER_COUNT = 15
 STATS_BOX_WIDTH = 200
 MESSAGE_BOX_HEIGHT = 64
 STATS_BOX_OFFSET = 10
+MINIMAP_TOP = 110 #the minimap is drawn below the stats text
+MONSTER_ALERT_RANGE = 5 #auto-explore and travel stop when a monster is this many tiles away
+MAX_TRAVEL_STEPS = 1000
+PLAYER_SHOOT_RANGE = 6 #the player can shoot monsters it can see this many tiles away
+DOOR_MIN_DISTANCE = 40 #the door is at least this many steps from where the player starts
+MONSTER_SAFE_DISTANCE = 10 #monsters start at least this many steps from the player
+
+#Dig direction for each arrow key
+DIG_DIRECTIONS = {pygame.K_DOWN: 'D', pygame.K_UP: 'U', pygame.K_LEFT: 'L', pygame.K_RIGHT: 'R'}
+MOVE_KEYS = {'D': pygame.K_DOWN, 'U': pygame.K_UP, 'L': pygame.K_LEFT, 'R': pygame.K_RIGHT}
+DIG_MESSAGES = {'D': "You dig down", 'U': "You dig up", 'L': "You dig left", 'R': "You dig right"}
+
 dungeonLevel = 1 #dungeon level starts at 1
 
+#Monsters and items are reused between levels
+monsterPool = pool.ObjectPool(GameObject.Monster)
+itemPool = pool.ObjectPool(GameObject.Item)
+
+#Speed of each monster type, in the same order as the monster images.
+#A monster with speed 2.0 gets two actions for every action of the player
+MONSTER_SPEEDS = [
+    2.0,    #giant cockroach
+    1.0,    #brain worm
+    0.5,    #mummy
+    1.0,    #ogre mage
+    1.0,    #red dragon
+]
+
+#Spell range in tiles of each monster type, 0 for monsters that can't cast spells
+MONSTER_SPELL_RANGES = [
+    0,      #giant cockroach
+    0,      #brain worm
+    0,      #mummy
+    5,      #ogre mage
+    7,      #red dragon
+]
+
 
 def set_up(MAP_WIDTH, MAP_HEIGHT):
     """This method initializes and sets up the game
@@ -28,6 +67,10 @@ def set_up(MAP_WIDTH, MAP_HEIGHT):
     #initializa pygame modules
     pygame.init()
 
+    #Log game events to a file if it is turned on
+    if events.LOG_FILE is not None:
+        events.subscribe(events.BatchedWriter(events.LOG_FILE))
+
     #Get a screen object to draw on
     #Total screen size is MAP_WIDTH + 265 (stats box) and MAP_HEIGHT + 128 (message box)
     screen = pygame.display.set_mode((MAP_WIDTH + STATS_BOX_WIDTH, MAP_HEIGHT + MESSAGE_BOX_HEIGHT), 0, 32)
@@ -35,7 +78,7 @@ def set_up(MAP_WIDTH, MAP_HEIGHT):
     pygame.display.set_caption("INF3331 Roguelike Project")
 
     # Create the first cave. This can take a couple of seconds to make
-    cave = mapgen.run_mapgen(MAP_WIDTH, MAP_HEIGHT, screen)
+    cave = mapgen.run_mapgen(MAP_WIDTH, MAP_HEIGHT, screen, dungeonLevel=dungeonLevel)
 
     #load monster images
     monster_images = [
@@ -59,15 +102,19 @@ def set_up(MAP_WIDTH, MAP_HEIGHT):
     weapon_tile = pygame.image.load(weapon_image).convert_alpha()
     door_tile = pygame.image.load(door_image).convert_alpha()
 
+    #Find out how far each tile is from the players start, the door, items and monsters are placed by that
+    placement = objectplacement.Placement(cave)
+
     #create player object
     player_image = pygame.image.load('graphics/Ikoner/player.png').convert_alpha()
-    player = GameObject.Player(screen, position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT,
-                    16)), object_image=player_image, object_cave=cave, dungeon_level=dungeonLevel)
+    player = GameObject.Player(screen, position=placement.start(), object_image=player_image, object_cave=cave,
+                               dungeon_level=dungeonLevel)
 
     #Run game
-    run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_tile, door_tile, MAP_HEIGHT, MAP_WIDTH)
+    run_game(screen, cave, player, placement, monster_tiles, armor_tile, food_tile, weapon_tile, door_tile, MAP_HEIGHT,
+             MAP_WIDTH)
 
-def make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile, door_tile):
+def make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile, door_tile, placement):
     """Creates the different items and put them in a list
        @param screen: the game screen to draw
        @param cave: the map
@@ -77,24 +124,29 @@ def make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapo
        @param food_tile: potion image
        @param weapon_tile: weapon image
        @param door_tile: door image
+       @param placement: the placement for this level, decides where the items are
        @return: list of items
     """
     items = []
 
+    #The door is placed first, so no item or monster ends up on it. The items are spread over the rest of the cave
+    doorPosition = placement.door(DOOR_MIN_DISTANCE)
+    positions = placement.spread(3 + 3 + 4)
+
     for i in range(3):
         #Make armor item
-        items.append(GameObject.Item(
+        items.append(itemPool.acquire(
                 screen,
-                position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT, 16)),
+                position=positions.pop(),
                 object_image=armor_tile,
                 object_cave=cave,
                 name="armor",
                 value=1))
 
         #Make weapon item
-        items.append(GameObject.Item(
+        items.append(itemPool.acquire(
                 screen,
-                position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT, 16)),
+                position=positions.pop(),
                 object_image=weapon_tile,
                 object_cave=cave,
                 name="weapon",
@@ -102,18 +154,18 @@ def make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapo
 
     #Make food item
     for i in range(4):
-        items.append(GameObject.Item(
+        items.append(itemPool.acquire(
                 screen,
-                position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT, 16)),
+                position=positions.pop(),
                 object_image=food_tile,
                 object_cave=cave,
                 name="food",
                 value=20))
 
     #make door
-    items.append(GameObject.Item(
+    items.append(itemPool.acquire(
             screen,
-            position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT, 16)),
+            position=doorPosition,
             object_image=door_tile,
             object_cave=cave,
             name="wooden door",
@@ -121,7 +173,7 @@ def make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapo
 
     return items
 
-def make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel):
+def make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel, placement):
     """Monsters change their stats and are killed in each level, so create new monsters when a new level is started
        @param screen: the game screen to draw
        @param cave: the map
@@ -129,18 +181,22 @@ def make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLev
        @param MAP_HEIGHT: the map heith (playable area) in pixels
        @param monster_tiles: monster images
        @param dungeonLevel: the current dungeon level
+       @param placement: the placement for this level, decides where the monsters are
        @return: list of monsters
     """
 
     monsters = []
 
-    for i in range(MONSTER_COUNT):
-        monsters.append(GameObject.Monster(
+    for position in placement.monsters(MONSTER_COUNT, MONSTER_SAFE_DISTANCE):
+        monsterType = random.randint(0, len(monster_tiles)-1)
+        monsters.append(monsterPool.acquire(
             screen,
-            position=(random.randrange(0, MAP_WIDTH, 16), random.randrange(0, MAP_HEIGHT, 16)),
-            object_image=monster_tiles[random.randint(0, len(monster_tiles)-1)],
+            position=position,
+            object_image=monster_tiles[monsterType],
             object_cave=cave,
-            dungeon_level=dungeonLevel))
+            dungeon_level=dungeonLevel,
+            speed=MONSTER_SPEEDS[monsterType],
+            spell_range=MONSTER_SPELL_RANGES[monsterType]))
 
     return monsters
 
@@ -153,11 +209,13 @@ def removeMonster(monsters):
         if m.getHP() <= 0:
             monsters.remove(m)
 
-def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_tile, door_tile, MAP_HEIGHT, MAP_WIDTH):
+def run_game(screen, cave, player, placement, monster_tiles, armor_tile, food_tile, weapon_tile, door_tile, MAP_HEIGHT,
+             MAP_WIDTH):
     """Run the game and the contains the main game loop
        @param screen: the game screen to draw
        @param cave: the map
        @param player: the player object
+       @param placement: the placement for the first level, the player is on its start tile
        @param monster_tiles: monster images
        @param armor_tile: armor image
        @param food_tile: potion image
@@ -169,13 +227,35 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
 
     global dungeonLevel
 
+    #The items are made first, so the door is placed before anything else
+    items = make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile, door_tile, placement)
     #Make list of monsters
-    monsters = make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel)
-    items = make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile, door_tile)
+    monsters = make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel, placement)
+    #Only monsters near the player are simulated, and they act in the order given by the scheduler
+    scheduler = turnscheduler.TurnScheduler()
+    activity = monsteractivity.ActivityIndex(monsters, scheduler)
+
+    #The cave is drawn once to a map surface, which is copied to the screen every frame
+    renderer = tilerenderer.TileRenderer(screen, cave, MAP_WIDTH, MAP_HEIGHT)
+    explored = exploration.ExploredMap(MAP_WIDTH / PIXELS, MAP_HEIGHT / PIXELS)
+    lineOfSight = lineofsight.LineOfSight(cave)
+    #Distance map to the items and the edge of the explored area, it grows as the player explores
+    exploreMap = distancemap.ExploreMap(cave, itemTiles(items))
+
+    #Keep track of the memory used by each part of the game. Shared objects are counted in the first part
+    memoryReport = memreport.MemoryReport(ignore=[screen])
+    memoryReport.register("tile images", lambda: list(set(tile.tile_image for row in cave for tile in row)) +
+                          monster_tiles + [armor_tile, food_tile, weapon_tile, door_tile, player.object_image])
+    memoryReport.register("cave grid", lambda: cave)
+    memoryReport.register("entities", lambda: [player, monsters, items, activity, scheduler])
+    memoryReport.register("UI text", lambda: Gamescreen.text_cache)
+    memoryReport.register("level caches", lambda: [renderer, explored, exploreMap, lineOfSight, monsterPool, itemPool])
+    memoryReport.levelChanged(dungeonLevel)
 
     #get clock so we can control frames per second
     clock = pygame.time.Clock()
     gameMessage = ""
+    repeatCount = 0 #number of times to repeat the next command, typed with the number keys
 
     #Main game loop - should probably be refactored (if time)
     while True:
@@ -192,44 +272,80 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
             #a key has been pressed
             if event.type == pygame.KEYDOWN:
 
-                #move player
+                #move player. With shift the player runs until something interesting happens,
+                #and with a repeat count the player moves that many times
                 if event.key == pygame.K_DOWN or \
                     event.key == pygame.K_UP or \
                     event.key == pygame.K_LEFT or \
                     event.key == pygame.K_RIGHT:
-                        player.handleKey(event, monsters)
-                        gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT)
+                        if event.mod & pygame.KMOD_SHIFT:
+                            turns = MAX_TRAVEL_STEPS
+                        else:
+                            turns = max(1, repeatCount)
+
+                        gameMessage = repeatMove(event, turns, player, monsters, items, screen, MAP_HEIGHT, MAP_WIDTH,
+                                                 activity, scheduler, renderer, explored, exploreMap, lineOfSight)
+
+                #Number keys give a repeat count for the next move or dig, like 10 and D and right arrow
+                elif pygame.K_0 <= event.key <= pygame.K_9:
+                    repeatCount = repeatCount * 10 + event.key - pygame.K_0
+                    gameMessage = "Repeat " + str(repeatCount) + " times"
 
                 elif event.key == pygame.K_s:
                     #Use item
-                    gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT)
+                    gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
 
                     for item in items:
                         if item.getPosition() == player.getPosition():
+                            if item.getItemName() != "wooden door":
+                                events.emit(events.PICKUP, item=item.getItemName(), value=item.useItem(),
+                                            position=item.getPosition())
+
                             if item.getItemName() == "wooden door":
                                 #Increase dungeonlevel
                                 dungeonLevel += 1
-                                #make new cave
-                                cave = mapgen.run_mapgen(MAP_WIDTH, MAP_HEIGHT, screen)
-                                #update player object
-                                player.update(cave, (random.randrange(0, MAP_WIDTH, 16), random.randrange(0,
-                                                MAP_HEIGHT, 16)))
-                                #make new monster list
-                                monsters = make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel)
-                                items = make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile, door_tile)
+                                #make new cave, reusing the tiles of the old one
+                                cave = mapgen.run_mapgen(MAP_WIDTH, MAP_HEIGHT, screen, cave, dungeonLevel)
+                                #update player object, it starts on a random tile in the largest part of the cave
+                                placement = objectplacement.Placement(cave)
+                                player.update(cave, placement.start())
+                                #make new monster list. The old monsters and items are reused
+                                monsterPool.releaseAll()
+                                itemPool.releaseAll()
+                                items = make_items(screen, cave, MAP_WIDTH, MAP_HEIGHT, armor_tile, food_tile, weapon_tile,
+                                                   door_tile, placement)
+                                monsters = make_monsters(screen, cave, MAP_WIDTH, MAP_HEIGHT, monster_tiles, dungeonLevel,
+                                                         placement)
+                                scheduler = turnscheduler.TurnScheduler()
+                                activity = monsteractivity.ActivityIndex(monsters, scheduler)
+                                renderer.rebuild(cave)
+                                lineOfSight.rebuild(cave)
+                                explored = exploration.ExploredMap(MAP_WIDTH / PIXELS, MAP_HEIGHT / PIXELS)
+                                exploreMap = distancemap.ExploreMap(cave, itemTiles(items))
                                 gameMessage = "New dungeon level! " + gameMessage
+                                events.emit(events.LEVEL, **mapgen.generationStats[-1])
+
+                                #check that the old level is not kept in memory. The warning is also in the snapshot file
+                                memoryWarning = memoryReport.levelChanged(dungeonLevel)
+                                if memoryWarning is not None:
+                                    gameMessage = memoryWarning + " " + gameMessage
+
+                                #the old items are reused by the new level, so stop looking at them
+                                break
 
                             elif item.getItemName() == "weapon":
                                 player.increaseAP(item.useItem())
                                 gameMessage = "You picked up a sword! Attack power increased by " + str(item.useItem()) \
                                                + "! " + gameMessage
                                 items.remove(item)
+                                exploreMap.found(player.getXposition() / PIXELS, player.getYposition() / PIXELS)
 
                             elif item.getItemName() == "armor":
                                 player.increaseArmor(item.useItem())
                                 gameMessage = "You picked up a shiny piece of armor! Armor increased by " + str(item.useItem()) \
                                                + "! " + gameMessage
                                 items.remove(item)
+                                exploreMap.found(player.getXposition() / PIXELS, player.getYposition() / PIXELS)
 
                             elif item.getItemName() == "food":
                                 player.increaseHP(item.useItem())
@@ -237,6 +353,7 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
                                                + "! " + gameMessage
 
                                 items.remove(item)
+                                exploreMap.found(player.getXposition() / PIXELS, player.getYposition() / PIXELS)
 
 
                 #player attack (A key pressed)
@@ -264,7 +381,7 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
 
                     #calculate battle outcome
                     battleresult = battlecalc.playerAttack(monsters, player, attackDir)
-                    monsterAttackMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT)
+                    monsterAttackMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
 
                     if battleresult[0]:
                         gameMessage = "You hit the monster for " + str(battleresult[1]) + "! You killed the monster! " + \
@@ -276,6 +393,54 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
 
                     removeMonster(monsters)
 
+                #Shoot at the closest monster the player can see (F key pressed)
+                elif event.key == pygame.K_f:
+
+                    targets = activity.monstersNear(player.getPosition(), PLAYER_SHOOT_RANGE / monsteractivity.REGION_SIZE + 1)
+                    battleresult = battlecalc.playerRangedAttack(targets, player, lineOfSight, PLAYER_SHOOT_RANGE)
+                    monsterAttackMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
+
+                    if battleresult[0]:
+                        gameMessage = "You shoot the monster for " + str(battleresult[1]) + "! You killed the monster! " + \
+                        monsterAttackMessage
+                    elif battleresult[1] == 0:
+                        gameMessage = "Nothing to shoot at! " + monsterAttackMessage
+                    else:
+                        gameMessage = "You shoot the monster for " + str(battleresult[1]) + "! " + monsterAttackMessage
+
+                    removeMonster(monsters)
+
+                #Zoom in (+ key pressed) or out (- key pressed), this does not use a turn
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    gameMessage = "Zoom " + str(renderer.changeZoom(1)) + "x"
+
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    gameMessage = "Zoom " + str(renderer.changeZoom(-1)) + "x"
+
+                #Show memory report (F12 key pressed), this does not use a turn
+                elif event.key == pygame.K_F12:
+                    gameMessage = memoryReport.format() + " " + mapgen.formatGenerationStats(mapgen.generationStats[-1])
+                    if memreport.SNAPSHOT_FILE is not None:
+                        memoryReport.write(gameMessage)
+
+                #Auto-explore (X key pressed), walk towards the nearest unexplored tile or item
+                elif event.key == pygame.K_x:
+
+                    playerX = player.getXposition() / PIXELS
+                    playerY = player.getYposition() / PIXELS
+
+                    #the item the player is standing on is already found
+                    exploreMap.found(playerX, playerY)
+
+                    if exploreMap.distance(playerX, playerY) == distancemap.UNREACHABLE:
+                        gameMessage = "There is nowhere to go!"
+                    else:
+                        gameMessage = travel(exploreMap, player, monsters, screen, MAP_HEIGHT, MAP_WIDTH, activity,
+                                             scheduler, renderer, explored, exploreMap, lineOfSight)
+                        #the explored area is revealed before the player gets to its edge, so only items are reached
+                        if exploreMap.distance(player.getXposition() / PIXELS, player.getYposition() / PIXELS) == 0:
+                            gameMessage = "You found something!"
+
                 #Dig down wall(D key pressed)
                 elif event.key == pygame.K_d:
 
@@ -286,50 +451,68 @@ def run_game(screen, cave, player, monster_tiles, armor_tile, food_tile, weapon_
                     digWhere = pygame.event.wait()         #Wait for an event
 
                     try:
-                        if digWhere.key == pygame.K_DOWN:
-                            mapgen.updateCave(screen, cave, 'D', player.getXposition(), player.getYposition())
-                            gameMessage = "You dig down"
+                        #with a repeat count the player digs a tunnel, digging and moving one tile each turn
+                        direction = DIG_DIRECTIONS.get(digWhere.key)
+                        gameMessage = repeatDig(direction, max(1, repeatCount), cave, player, monsters, screen,
+                                                MAP_HEIGHT, MAP_WIDTH, activity, scheduler, renderer, explored, exploreMap,
+                                                lineOfSight)
+                    except:
+                        print "DEBUG: Event bugged out"
 
-                        elif digWhere.key == pygame.K_UP:
-                            mapgen.updateCave(screen, cave, 'U', player.getXposition(), player.getYposition())
-                            gameMessage = "You dig up"
+                #a repeat count is only used by the command right after it
+                if not pygame.K_0 <= event.key <= pygame.K_9:
+                    repeatCount = 0
 
-                        elif digWhere.key == pygame.K_LEFT:
-                            mapgen.updateCave(screen, cave, 'L', player.getXposition(), player.getYposition())
-                            gameMessage = "You dig left"
+                break #only one event is handled at a time, so break out of the event loop after one event is finished
 
-                        elif digWhere.key == pygame.K_RIGHT:
-                            mapgen.updateCave(screen, cave, 'R', player.getXposition(), player.getYposition())
-                            gameMessage = "You dig right"
+            #the map has been clicked, travel to the clicked tile
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and \
+                    event.pos[0] < MAP_WIDTH and event.pos[1] < MAP_HEIGHT:
+
+                #the view can be zoomed in, so the renderer finds the tile
+                target = renderer.tileAt(event.pos)
+                repeatCount = 0
+
+                if not explored.isExplored(target[0], target[1]) or not cave[target[1]][target[0]].isPassable():
+                    gameMessage = "You can't travel there!"
+                else:
+                    #only the explored tiles between the player and the target are searched
+                    travelMap = distancemap.findPath(exploreMap.passable, exploreMap.width, (player.getXposition() / PIXELS,
+                                                     player.getYposition() / PIXELS), target, MAX_TRAVEL_STEPS)
+                    if travelMap is None:
+                        gameMessage = "There is nowhere to go!"
+                    else:
+                        gameMessage = travel(travelMap, player, monsters, screen, MAP_HEIGHT, MAP_WIDTH, activity, scheduler,
+                                             renderer, explored, exploreMap, lineOfSight)
 
-                        gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT)
-                    except:
-                        print "DEBUG: Event bugged out"
+                break
 
-                break #only one event is handled at a time, so break out of the event loop after one event is finished
+        #Write a memory snapshot if it is time for one
+        memoryReport.update()
 
-        #Divide by 16 to get correct tile index
-        for y in range(0, MAP_HEIGHT / 16):
-            for x in range(0, MAP_WIDTH / 16):
-                cave[y][x].draw()
+        #Update the explored part of the cave
+        reveal(player, explored, renderer, exploreMap)
 
-        #draw player, monsters and items
-        player.draw()
+        renderer.draw(player)
+
+        #draw player, monsters and items at the current zoom
+        renderer.drawObject(player)
 
         for m in monsters:
-            m.draw()
+            renderer.drawObject(m)
 
         for i in items:
-            i.draw()
+            renderer.drawObject(i)
 
         #Make stats box and display it
         Gamescreen.make_stats_box(screen, player, dungeonLevel, MAP_WIDTH, MAP_HEIGHT, STATS_BOX_WIDTH)
+        renderer.drawMinimap(player, MAP_WIDTH + STATS_BOX_OFFSET, MINIMAP_TOP, STATS_BOX_WIDTH - 2 * STATS_BOX_OFFSET)
         Gamescreen.make_message_box(screen, MAP_HEIGHT, MESSAGE_BOX_HEIGHT, MAP_WIDTH, gameMessage)
 
         #Display
         pygame.display.flip()
 
-def monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT):
+def monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight):
     """Monsters can move and attack the player
        @param monsters: list of monsters
        @param player: the played object
@@ -337,23 +520,47 @@ def monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAG
        @param MAP_HEIGHT: the mapheight(playable area) in pixels
        @param MAP_WIDTH: the mapwidth(playable area) in pixels
        @param MESSAGE_BOX_HEIGHT: the height of the message box rectangle
+       @param activity: the activity index deciding which monsters are awake
+       @param scheduler: the turn scheduler
+       @param lineOfSight: the line of sight, used by spellcasters
     """
 
     global dungeonLevel
 
-    #go through the monsters one at a time
-    for m in monsters:
-        checkIfFoundPlayer = m.findPlayer(player, monsters)
+    #Monsters far away from the player are sleeping, so only the ones nearby are scheduled
+    nearby = activity.update(player)
+
+    #The player has used its action. Let the monsters act until it is the players turn again.
+    #Fast monsters can act several times, and slow monsters skip some turns
+    actedMonsters = []
+    scheduler.schedule(player)
+    actor = scheduler.pop()
+
+    while actor is not player:
+        #killed monsters are not rescheduled
+        if actor.getHP() > 0:
+            oldPosition = actor.getPosition()
+
+            #spellcasters that can see the player stay where they are and cast
+            if battlecalc.playerIsAdjacent(actor, player) or not battlecalc.canCastAt(actor, player, lineOfSight):
+                checkIfFoundPlayer = actor.findPlayer(player, nearby)
+
+                #if -1 is returned, the player is not nearby
+                if checkIfFoundPlayer == -1:
+                    actor.walk(nearby, player)
 
-        #if -1 is returned, the player is not nearby
-        if checkIfFoundPlayer == -1:
-            m.walk(monsters, player)
+            activity.moved(actor, oldPosition)
+            actedMonsters.append(actor)
+            scheduler.schedule(actor)
 
-    #Monster attack!
-    monsterAttackResult = battlecalc.monsterAttack(monsters, player)
+        actor = scheduler.pop()
+
+    #Monster attack! Monsters attack once for every action they got this turn
+    monsterAttackResult = battlecalc.monsterAttack(actedMonsters, player, lineOfSight)
 
     #player died
     if monsterAttackResult[0]:
+        events.emit(events.DEATH, level=dungeonLevel, damage=monsterAttackResult[1], position=player.getPosition())
 
         Gamescreen.make_stats_box(screen, player, dungeonLevel, MAP_WIDTH, MAP_HEIGHT, STATS_BOX_WIDTH)
         Gamescreen.make_message_box(screen, MAP_HEIGHT, MESSAGE_BOX_HEIGHT, MAP_WIDTH, "The monster(s) around you " \
@@ -367,6 +574,180 @@ def monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAG
         else:
             return ""
 
+def reveal(player, explored, renderer, exploreMap):
+    """Explore the tiles around the player
+       @param player: the player object
+       @param explored: the explored map
+       @param renderer: the tile renderer, shows the new tiles on the minimap
+       @param exploreMap: the auto-explore distance map, grows with the explored area
+    """
+
+    #Divide by PIXELS to get correct tile index
+    revealed = explored.reveal(player.getXposition() / PIXELS, player.getYposition() / PIXELS)
+    renderer.reveal(revealed)
+    if revealed:
+        exploreMap.reveal(revealed, explored)
+
+def itemTiles(items):
+    """Get the tiles of the items, they are goals for auto-explore
+       @param items: list of items
+       @return: list of tuples with the x and y index of the item tiles
+    """
+
+    return [(item.getXposition() / PIXELS, item.getYposition() / PIXELS) for item in items]
+
+def monsterInRange(player, activity):
+    """Check if a monster is close enough to the player to stop auto-explore and travel
+       @param player: the player object
+       @param activity: the activity index
+       @return: True if a monster is within MONSTER_ALERT_RANGE tiles, False if not
+    """
+
+    for m in activity.monstersNear(player.getPosition(), 1):
+        if abs(m.getXposition() - player.getXposition()) / PIXELS + \
+                abs(m.getYposition() - player.getYposition()) / PIXELS <= MONSTER_ALERT_RANGE:
+            return True
+
+    return False
+
+def travel(pathMap, player, monsters, screen, MAP_HEIGHT, MAP_WIDTH, activity, scheduler, renderer, explored, exploreMap,
+           lineOfSight):
+    """Walk the player along a path, one turn per step, until the goal is reached or a monster
+       comes into range. The screen is not drawn until the walk is finished
+       @param pathMap: the path to follow, from distancemap.findPath, or the auto-explore map
+       @param player: the player object
+       @param monsters: list of monsters
+       @param screen: the screen to draw on
+       @param MAP_HEIGHT: the mapheight(playable area) in pixels
+       @param MAP_WIDTH: the mapwidth(playable area) in pixels
+       @param activity: the activity index
+       @param scheduler: the turn scheduler
+       @param renderer: the tile renderer
+       @param explored: the explored map
+       @param exploreMap: the auto-explore distance map
+       @param lineOfSight: the line of sight
+       @return: the game message
+    """
+
+    for step in range(MAX_TRAVEL_STEPS):
+
+        if monsterInRange(player, activity):
+            return "There is a monster nearby!"
+
+        x = player.getXposition() / PIXELS
+        y = player.getYposition() / PIXELS
+        nearby = activity.monstersNear(player.getPosition(), 1)
+        nextStep = pathMap.nextStep(x, y, lambda stepX, stepY: player.checkValidMove(stepY * PIXELS, stepX * PIXELS, nearby, None))
+
+        if nextStep is None:
+            if pathMap.distance(x, y) == 0:
+                return "You have arrived!"
+            if pathMap.distance(x, y) == distancemap.UNREACHABLE:
+                return "There is nowhere to go!"
+            return "Something is in the way!"
+
+        #take the step and let the monsters act
+        hitPoints = player.getHP()
+        player.move((nextStep[0] - x) * PIXELS, (nextStep[1] - y) * PIXELS)
+        gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
+        reveal(player, explored, renderer, exploreMap)
+
+        if player.getHP() < hitPoints:
+            return gameMessage
+
+    return ""
+
+def repeatMove(event, turns, player, monsters, items, screen, MAP_HEIGHT, MAP_WIDTH, activity, scheduler, renderer,
+               explored, exploreMap, lineOfSight):
+    """Move the player in the same direction for several turns. The move stops early if the player
+       walks into something, takes damage, finds an item or a monster comes into range.
+       The screen is not drawn until all the turns are done
+       @param event: the arrow key event
+       @param turns: max number of turns to move
+       @param player: the player object
+       @param monsters: list of monsters
+       @param items: list of items
+       @param screen: the screen to draw on
+       @param MAP_HEIGHT: the mapheight(playable area) in pixels
+       @param MAP_WIDTH: the mapwidth(playable area) in pixels
+       @param activity: the activity index
+       @param scheduler: the turn scheduler
+       @param renderer: the tile renderer
+       @param explored: the explored map
+       @param exploreMap: the auto-explore distance map
+       @param lineOfSight: the line of sight
+       @return: the game message
+    """
+
+    gameMessage = ""
+
+    for turn in range(turns):
+
+        #the first step is always taken, like a normal move
+        if turn > 0 and monsterInRange(player, activity):
+            return "There is a monster nearby!"
+
+        position = player.getPosition()
+        hitPoints = player.getHP()
+
+        #only the monsters close to the player can be in the way
+        player.handleKey(event, activity.monstersNear(player.getPosition(), 1))
+        gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
+        reveal(player, explored, renderer, exploreMap)
+
+        if player.getPosition() == position or player.getHP() < hitPoints:
+            break
+
+        #a run stops at items
+        for item in items:
+            if turns > 1 and item.getPosition() == player.getPosition():
+                return "You found something! " + gameMessage
+
+    return gameMessage
+
+def repeatDig(direction, turns, cave, player, monsters, screen, MAP_HEIGHT, MAP_WIDTH, activity, scheduler,
+              renderer, explored, exploreMap, lineOfSight):
+    """Dig in a direction. If more than one turn is given, the player digs a tunnel by digging and
+       moving into the dug tile each turn, and stops like repeatMove does
+       @param direction: dig direction, or None to dig nothing
+       @param turns: number of turns to dig
+       @param cave: the map
+       @return: the game message
+       The other parameters are the same as for repeatMove
+    """
+
+    gameMessage = ""
+
+    for turn in range(turns):
+
+        if turn > 0 and monsterInRange(player, activity):
+            return "There is a monster nearby!"
+
+        hitPoints = player.getHP()
+
+        dugTile = mapgen.updateCave(screen, cave, direction, player.getXposition(), player.getYposition())
+        if direction is not None:
+            gameMessage = DIG_MESSAGES[direction]
+
+        #only the dug tile needs to be drawn again
+        if dugTile is not None:
+            renderer.updateTile(dugTile, explored)
+            lineOfSight.caveChanged(dugTile)
+            exploreMap.addPassable(dugTile.getXposition() / PIXELS, dugTile.getYposition() / PIXELS)
+
+        if turns > 1 and direction is not None:
+            position = player.getPosition()
+            player.handleKey(pygame.event.Event(pygame.KEYDOWN, key=MOVE_KEYS[direction]),
+                             activity.monstersNear(player.getPosition(), 1))
+
+        gameMessage = monsterMoveAndAttack(monsters, player, screen, MAP_HEIGHT, MAP_WIDTH, MESSAGE_BOX_HEIGHT, activity, scheduler, lineOfSight)
+        reveal(player, explored, renderer, exploreMap)
+
+        if player.getHP() < hitPoints or (turns > 1 and (direction is None or player.getPosition() == position)):
+            break
+
+    return gameMessage
+
 def game_over():
     """This is called when a player dies. Wait 5 seconds before quitting the program"""
     time.sleep(5)
@@ -374,5 +755,6 @@ def game_over():
 
 def exit_game():
     """Exit the game"""
+    mapgen.closeStripePool()
     sys.exit()
 
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+    Game events for analytics. The game code calls emit with the event type and its fields,
+    and every subscriber gets the event as a dictionary. When nothing is subscribed emit returns
+    at once. BatchedWriter is a subscriber that writes the events to a JSON lines file from a
+    background thread, so writing to disk never slows down a turn.
+"""
+
+import json, os, threading, time, atexit
+from collections import deque
+
+#Set LOG_FILE to a file name to write all events to that file
+LOG_FILE = None
+
+#Event types
+DAMAGE_DEALT = "damage_dealt"   #the player hit a monster
+DAMAGE_TAKEN = "damage_taken"   #a monster hit the player
+KILL = "kill"                   #the player killed a monster
+PICKUP = "pickup"               #the player picked up an item
+DIG = "dig"                     #a wall was dug down
+LEVEL = "level"                 #the player went through a door to a new dungeon level
+DEATH = "death"                 #the player died
+
+subscribers = []
+
+def subscribe(subscriber):
+    """Start sending events to a subscriber
+       @param subscriber: function taking the event dictionary
+    """
+    subscribers.append(subscriber)
+
+def unsubscribe(subscriber):
+    """Stop sending events to a subscriber
+       @param subscriber: a subscribed function
+    """
+    subscribers.remove(subscriber)
+
+def emit(eventType, **fields):
+    """Send an event to all subscribers
+       @param eventType: one of the event types above
+       @param fields: the event data
+    """
+    if not subscribers:
+        return
+
+    fields['event'] = eventType
+    fields['time'] = time.time()
+    for subscriber in subscribers:
+        subscriber(fields)
+
+class BatchedWriter:
+    """Writes events to a JSON lines file. Events are put in a queue, and a background thread
+       writes everything in the queue in batches every FLUSH_INTERVAL seconds.
+       When the file gets bigger than maxBytes, it is renamed to filename.1 and a new file is started
+    """
+
+    FLUSH_INTERVAL = 0.5 #seconds
+    BATCH_SIZE = 1000    #events written with one write call
+
+    def __init__(self, filename, maxBytes=10 * 1024 * 1024, backupCount=3):
+        """Constructor. Starts the writer thread
+           @param filename: the file to write to
+           @param maxBytes: max file size before the file is rotated
+           @param backupCount: number of old files to keep
+        """
+        self.filename = filename
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.queue = deque()    #appending and popping from a deque is thread safe
+        self.stopped = threading.Event()
+        self.logFile = open(filename, 'a')
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+        #write the last events when the game exits
+        atexit.register(self.close)
+
+    def __call__(self, event):
+        """Queue an event, called by emit
+           @param event: the event dictionary
+        """
+        self.queue.append(event)
+
+    def run(self):
+        """The writer thread"""
+        while not self.stopped.is_set():
+            self.stopped.wait(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Write all queued events to the file, BATCH_SIZE events at a time"""
+        while self.queue:
+            lines = []
+            while self.queue and len(lines) < self.BATCH_SIZE:
+                lines.append(json.dumps(self.queue.popleft()))
+
+            self.logFile.write("\n".join(lines) + "\n")
+            self.logFile.flush()
+
+            if self.logFile.tell() > self.maxBytes:
+                self.rotate()
+
+    def rotate(self):
+        """Start a new file, and keep the old ones as filename.1, filename.2 and so on"""
+        self.logFile.close()
+
+        for number in range(self.backupCount - 1, 0, -1):
+            if os.path.exists(self.filename + "." + str(number)):
+                os.rename(self.filename + "." + str(number), self.filename + "." + str(number + 1))
+        if self.backupCount > 0:
+            os.rename(self.filename, self.filename + ".1")
+        else:
+            os.remove(self.filename)
+
+        self.logFile = open(self.filename, 'a')
+
+    def close(self):
+        """Stop the writer thread and write the last events"""
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.thread.join()
+            self.flush()
+            self.logFile.close()